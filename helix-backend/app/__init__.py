@@ -1,20 +1,35 @@
 from flask import Flask
 from flask_cors import CORS
 from .config import Config
-from .extensions import db, migrate, socketio
+from .extensions import db, migrate, socketio, clients
+from .concurrency import is_green, patch_psycopg
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    if is_green():
+        patch_psycopg()
+
     CORS(app)
     db.init_app(app)
     migrate.init_app(app, db)
-    socketio.init_app(app, cors_allowed_origins="*") 
+    socketio.init_app(app, async_mode=app.config.get('ASYNC_MODE'), cors_allowed_origins="*")
+    clients.init_app(app)
+    # Imported here: once the app.models package is loaded it shadows a
+    # module-level `models` name in this package.
+    from .extensions import models
+    models.init_app(app)
     
     from .api import chat_bp, sequence_bp, document_bp
     app.register_blueprint(chat_bp, url_prefix='/api/chat')
     app.register_blueprint(sequence_bp, url_prefix='/api/sequence')
     app.register_blueprint(document_bp, url_prefix='/api/documents')
+
+    from .api import socket_events  # registers Socket.IO handlers
+    from .services.ingestion_service import ingestion
+    ingestion.init_app(app)
+    from .services import unit_of_work
+    unit_of_work.init_app(app)
     
     return app
\ No newline at end of file
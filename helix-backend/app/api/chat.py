@@ -2,6 +2,7 @@
 from flask import Blueprint, request, jsonify
 from ..services.chat_service import ChatService
 from ..extensions import db 
+from .paging import page_args, session_etag, not_modified, with_etag
 
 chat_bp = Blueprint('chat_bp', __name__)
 
@@ -49,4 +50,27 @@ def trigger_rag(session_id):
         return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error in RAG enhancement for session {session_id}: {e}")
-        return jsonify({"error": "Server error occurred"}), 500
\ No newline at end of file
+        return jsonify({"error": "Server error occurred"}), 500
+
+
+@chat_bp.route('/<int:session_id>/history', methods=['GET'])
+def get_chat_history(session_id):
+    # ?after=<msg_id>&limit=N. Pages are validated against the session's
+    # updated_at, so polling an unchanged session costs one primary-key read.
+    try:
+        after, limit = page_args('after')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    etag = session_etag(session_id)
+    if etag is None:
+        return jsonify({"error": f"Session with ID {session_id} not found."}), 404
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    try:
+        history = ChatService().get_history(session_id, after=after, limit=limit)
+        return with_etag(jsonify(history), etag), 200
+    except Exception as e:
+        print(f"Error retrieving history for session {session_id}: {e}")
+        return jsonify({"error": "Failed to retrieve chat history"}), 500
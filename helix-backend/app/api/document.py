@@ -2,6 +2,9 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.utils import secure_filename
 from ..services.document_service import DocumentService
+from ..services.ingestion_service import ingestion
+from ..extensions import clients, db
+from ..models import IngestionJob
 import os
 
 document_bp = Blueprint('document_bp', __name__)
@@ -25,11 +28,18 @@ def upload_document():
         print(f"Received file upload request: {filename}")
 
         try:
-            document_service = DocumentService()
+            if request.args.get('sync') in ('1', 'true'):
+                document_service = DocumentService()
+                result = document_service.process_and_upsert(file, filename)
+                return jsonify(result), 200 if result.get("status") == "success" else 400
 
-            result = document_service.process_and_upsert(file, filename)
-
-            return jsonify(result), 200 if result.get("status") == "success" else 400
+            job = ingestion.submit(file, filename)
+            return jsonify({
+                "message": f"'{filename}' uploaded and queued for processing.",
+                "filename": filename,
+                "job_id": job.job_id,
+                "status": job.status
+            }), 202
 
         except ValueError as e:
             print(f"ValueError during upload: {e}")
@@ -38,4 +48,29 @@ def upload_document():
             print(f"Unexpected error during upload: {e}")
             return jsonify({"error": "An unexpected error occurred processing the file."}), 500
     else:
-        return jsonify({"error": "File type not allowed. Please upload PDF or TXT."}), 400
\ No newline at end of file
+        return jsonify({"error": "File type not allowed. Please upload PDF or TXT."}), 400
+
+@document_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def get_ingestion_job(job_id):
+    job = db.session.get(IngestionJob, job_id)
+    if not job:
+        return jsonify({"error": f"Ingestion job {job_id} not found."}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@document_bp.route('/index/refresh', methods=['POST'])
+def refresh_index_clients():
+    try:
+        clients.refresh()
+        return jsonify({"message": "Vector index clients refreshed.", "status": "success"}), 200
+    except ValueError as e:
+        print(f"ValueError refreshing index clients: {e}")
+        return jsonify({"error": str(e)}), 503
+
+
+@document_bp.route('/embedding-cache/stats', methods=['GET'])
+def embedding_cache_stats():
+    cache = clients.get_embedding_cache()
+    if cache is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **cache.stats()}), 200
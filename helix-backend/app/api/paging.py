@@ -0,0 +1,52 @@
+# app/api/paging.py
+#
+# Shared by the paginated history endpoints: keyset page arguments and
+# ETag validators derived from Session.updated_at.
+import hashlib
+from datetime import datetime
+from flask import request, current_app
+from ..extensions import db
+from ..models import Session
+
+
+def page_args(cursor_name):
+    # (cursor, limit) from the query string; raises ValueError on bad input.
+    default = current_app.config.get('HISTORY_PAGE_SIZE', 100)
+    maximum = current_app.config.get('HISTORY_MAX_PAGE_SIZE', 500)
+    try:
+        limit = int(request.args.get('limit', default))
+        cursor = request.args.get(cursor_name)
+        cursor = int(cursor) if cursor is not None else None
+    except ValueError:
+        raise ValueError(f"'limit' and '{cursor_name}' must be integers")
+    if limit < 1:
+        raise ValueError("'limit' must be at least 1")
+    return cursor, min(limit, maximum)
+
+
+def session_etag(session_id):
+    # ETag for the current request's view of a session, from a single
+    # primary-key lookup; None when the session does not exist. The query
+    # string is part of it so every page validates on its own. No
+    # Last-Modified is sent: HTTP dates have whole-second precision, and two
+    # writes within one second would look like a single version.
+    row = db.session.query(Session.updated_at).filter(Session.s_id == session_id).first()
+    if row is None:
+        return None
+    last_modified = row.updated_at or datetime(1970, 1, 1)
+    return hashlib.sha256(
+        f"{session_id}:{last_modified.isoformat()}:{request.path}?{request.query_string.decode()}".encode()
+    ).hexdigest()[:32]
+
+
+def not_modified(etag):
+    # A 304 for a client whose If-None-Match holds this version, else None.
+    if not request.if_none_match or not request.if_none_match.contains_weak(etag):
+        return None
+    return with_etag(current_app.response_class(status=304), etag)
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -1,24 +1,36 @@
 # app/api/sequence.py
 from flask import Blueprint, request, jsonify
 from ..services.sequence_service import SequenceService
-from ..extensions import db
-from ..models import Message, Sequence
+from ..services.chat_service import chat_room
+from ..extensions import db, clients, socketio
+from .paging import page_args, session_etag, not_modified, with_etag
 
 sequence_bp = Blueprint('sequence_bp', __name__)
 
+
+def emit_sequence_part(session_id):
+    # Clients in the chat room render each part as soon as it streams in; the
+    # HTTP response carries the saved version.
+    def on_part(content, index):
+        socketio.emit('sequence_part', {"session_id": session_id, "index": index, "content": content},
+                      to=chat_room(session_id))
+    return on_part
+
 @sequence_bp.route('/<int:session_id>/generate', methods=['POST'])
 def trigger_sequence_generation(session_id):
     sequence_service = SequenceService()
     data = request.get_json()
     if not data or 'context' not in data: return jsonify({"error": "Missing 'context' in request body"}), 400
     generation_context = data['context']
+    use_cache = not data.get('bypass_cache', False)
     try:
-        generated_sequences = sequence_service.generate_sequences(session_id, generation_context)
-        sequences_text = "Generated Sequences:\n" + "\n".join([f"{i+1}. {s['content']}" for i, s in enumerate(generated_sequences)])
-        sequence_message = Message(session_id=session_id, msg_role='tool', msg_content=sequences_text)
-        db.session.add(sequence_message)
-        db.session.commit()
-        return jsonify(generated_sequences), 201
+        generated_sequences = sequence_service.generate_sequences(session_id, generation_context, use_cache=use_cache,
+                                                                  on_part=emit_sequence_part(session_id))
+        response = jsonify(generated_sequences)
+        response.headers['X-Helix-Sequence-Version'] = str(sequence_service.last_version)
+        if sequence_service.last_cache_status:
+            response.headers['X-Helix-Cache'] = sequence_service.last_cache_status
+        return response, 201
     except Exception as e:
         db.session.rollback() 
         print(f"Error generating sequences API: {e}")
@@ -34,19 +46,24 @@ def trigger_sequence_modification(session_id):
         return jsonify({"error": "Missing 'instruction' in request body"}), 400
 
     modification_instruction = data['instruction']
+    parts = data.get('parts')
+    if parts is not None and not isinstance(parts, list):
+        return jsonify({"error": "'parts' must be a list of message part numbers"}), 400
 
     try:
         modified_sequences = sequence_service.modify_sequences(
             session_id,
-            modification_instruction
+            modification_instruction,
+            on_part=emit_sequence_part(session_id),
+            parts=parts
         )
 
-        sequences_text = "Modified Sequences:\n" + "\n".join([f"{i+1}. {s['content']}" for i, s in enumerate(modified_sequences)])
-        sequence_message = Message(session_id=session_id, msg_role='tool', msg_content=sequences_text)
-        db.session.add(sequence_message)
-        db.session.commit()
-
-        return jsonify(modified_sequences), 200
+        changed_ids = sequence_service.last_changed_seq_ids
+        response = jsonify(modified_sequences)
+        # The body stays the full set of 4; the header names the rows that changed.
+        response.headers['X-Helix-Changed-Seq-Ids'] = ",".join(str(i) for i in changed_ids)
+        response.headers['X-Helix-Sequence-Version'] = str(sequence_service.last_version)
+        return response, 200
     except ValueError as e: 
         print(f"Value Error modifying sequences API: {e}")
         return jsonify({"error": str(e)}), 400 
@@ -55,23 +72,71 @@ def trigger_sequence_modification(session_id):
         print(f"Error modifying sequences API: {e}")
         return jsonify({"error": "Failed to modify sequences"}), 500
 
+@sequence_bp.route('/cache/stats', methods=['GET'])
+def get_sequence_cache_stats():
+    cache = clients.get_sequence_cache()
+    if cache is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **cache.stats()}), 200
+
+
 @sequence_bp.route('/<int:session_id>', methods=['GET'])
 def get_session_sequences(session_id):
     sequence_service = SequenceService()
     try:
-        sequences = Sequence.query.filter_by(session_id=session_id)\
-                                  .order_by(Sequence.seq_created_at.desc())\
-                                  .limit(4).all()
-        sequences.reverse()
-        return jsonify([
-             {"seq_id": s.seq_id, "session_id": s.session_id, "content": s.seq_content, "role": s.seq_role, "created_at": s.seq_created_at.isoformat(), "updated_at": s.seq_updated_at.isoformat()}
-             for s in sequences
-        ]), 200
+        return jsonify(sequence_service.get_sequences_for_session(session_id)), 200
     except Exception as e:
         print(f"Error retrieving sequences for session {session_id}: {e}")
         return jsonify({"error": "Failed to retrieve sequences"}), 500
 
 
+@sequence_bp.route('/<int:session_id>/versions', methods=['GET'])
+def get_session_sequence_versions(session_id):
+    # Newest first; ?before=<version_no>&limit=N, validated like the chat history.
+    try:
+        before, limit = page_args('before')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    etag = session_etag(session_id)
+    if etag is None:
+        return jsonify({"error": f"Session with ID {session_id} not found."}), 404
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    sequence_service = SequenceService()
+    try:
+        versions = sequence_service.list_versions(session_id, before=before, limit=limit)
+        return with_etag(jsonify(versions), etag), 200
+    except Exception as e:
+        print(f"Error listing sequence versions for session {session_id}: {e}")
+        return jsonify({"error": "Failed to list sequence versions"}), 500
+
+
+@sequence_bp.route('/<int:session_id>/versions/<int:version_no>', methods=['GET'])
+def get_session_sequence_version(session_id, version_no):
+    sequence_service = SequenceService()
+    try:
+        return jsonify(sequence_service.get_version(session_id, version_no)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        print(f"Error retrieving sequence version {version_no} for session {session_id}: {e}")
+        return jsonify({"error": "Failed to retrieve sequence version"}), 500
+
+
+@sequence_bp.route('/<int:session_id>/versions/<int:from_version_no>/diff/<int:to_version_no>', methods=['GET'])
+def diff_session_sequence_versions(session_id, from_version_no, to_version_no):
+    sequence_service = SequenceService()
+    try:
+        return jsonify(sequence_service.diff_versions(session_id, from_version_no, to_version_no)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        print(f"Error diffing sequence versions for session {session_id}: {e}")
+        return jsonify({"error": "Failed to diff sequence versions"}), 500
+
+
 @sequence_bp.route('/<int:sequence_id>', methods=['PUT'])
 def update_sequence_content(sequence_id):
     sequence_service = SequenceService()
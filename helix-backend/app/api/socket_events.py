@@ -0,0 +1,69 @@
+# app/api/socket_events.py
+from flask_socketio import join_room, leave_room, emit
+from ..extensions import socketio
+from ..services.ingestion_service import job_room
+from ..services.chat_service import ChatService, chat_room
+
+
+@socketio.on('join_ingestion_job')
+def on_join_ingestion_job(data):
+    job_id = (data or {}).get('job_id')
+    if not job_id:
+        emit('error', {"error": "Missing 'job_id'"})
+        return
+    join_room(job_room(job_id))
+
+
+@socketio.on('leave_ingestion_job')
+def on_leave_ingestion_job(data):
+    job_id = (data or {}).get('job_id')
+    if job_id:
+        leave_room(job_room(job_id))
+
+
+@socketio.on('join_chat_session')
+def on_join_chat_session(data):
+    session_id = (data or {}).get('session_id')
+    if not session_id:
+        emit('error', {"error": "Missing 'session_id'"})
+        return
+    join_room(chat_room(session_id))
+
+
+@socketio.on('leave_chat_session')
+def on_leave_chat_session(data):
+    session_id = (data or {}).get('session_id')
+    if session_id:
+        leave_room(chat_room(session_id))
+
+
+@socketio.on('send_message')
+def on_send_message(data):
+    # Streaming counterpart of POST /api/chat/<id>/message: deltas, function
+    # calls and the final message go to the session's room.
+    data = data or {}
+    session_id = data.get('session_id')
+    if not session_id or not data.get('message'):
+        emit('error', {"error": "Missing 'session_id' or 'message'"})
+        return
+    room = chat_room(session_id)
+    join_room(room)
+
+    errors = []
+
+    def emit_to_room(event, payload):
+        if event == 'chat_error':
+            errors.append(payload)
+        socketio.emit(event, payload, to=room)
+
+    try:
+        ChatService().stream_message(session_id, data['message'], emit_to_room)
+    except ValueError as e:
+        print(f"Value Error processing streamed message for session {session_id}: {e}")
+        emit('chat_error', {"session_id": session_id, "error": str(e)})
+    except Exception as e:
+        print(f"Error processing streamed message for session {session_id}: {e}")
+        # Failures before the model call (session lookup, history) have not
+        # told the client anything yet; it would wait forever.
+        if not errors:
+            emit('chat_error', {"session_id": session_id, "error": "Failed to process message"})
@@ -0,0 +1,39 @@
+# app/concurrency.py
+# run.py monkey-patches the process with eventlet before anything else is
+# imported when ASYNC_MODE is 'eventlet'. Code that cannot rely on the patched
+# stdlib alone (C extensions, process pools) checks is_green() and switches
+# to a cooperative path.
+
+
+def is_green():
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    return patcher.is_monkey_patched('socket')
+
+
+def patch_psycopg():
+    # psycopg2 talks to the server from C, out of reach of monkey patching.
+    # A wait callback hands each socket wait back to the eventlet hub
+    # (the approach psycogreen takes) so queries do not stall other requests.
+    try:
+        import psycopg2
+        from psycopg2 import extensions
+    except ImportError:
+        return
+    from eventlet.hubs import trampoline
+
+    def wait_callback(conn, timeout=-1):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                break
+            elif state == extensions.POLL_READ:
+                trampoline(conn.fileno(), read=True)
+            elif state == extensions.POLL_WRITE:
+                trampoline(conn.fileno(), write=True)
+            else:
+                raise psycopg2.OperationalError(f"Bad result from poll: {state}")
+
+    extensions.set_wait_callback(wait_callback)
@@ -5,9 +5,86 @@ load_dotenv()
 
 class Config:
     
+    # 'pinecone' or 'local' (embedded memory-mapped store, for dev/CI/air-gapped setups)
+    VECTOR_STORE_BACKEND = os.environ.get('VECTOR_STORE_BACKEND', 'pinecone')
+    LOCAL_VECTOR_STORE_PATH = os.environ.get('LOCAL_VECTOR_STORE_PATH', 'vector_store')
+    LOCAL_VECTOR_STORE_METRIC = os.environ.get('LOCAL_VECTOR_STORE_METRIC', 'cosine')
+    LOCAL_VECTOR_STORE_IVF_MIN_ROWS = int(os.environ.get('LOCAL_VECTOR_STORE_IVF_MIN_ROWS', 50000))
+    LOCAL_VECTOR_STORE_NPROBE = int(os.environ.get('LOCAL_VECTOR_STORE_NPROBE', 8))
+
     PINECONE_API_KEY = os.environ.get('PINECONE_API_KEY')
     PINECONE_INDEX_NAME = os.environ.get('PINECONE_INDEX_NAME', 'helix-documents')
+    PINECONE_POOL_THREADS = int(os.environ.get('PINECONE_POOL_THREADS', 4))
+    PINECONE_VERIFY_ON_STARTUP = os.environ.get('PINECONE_VERIFY_ON_STARTUP', '1') == '1'
+    PINECONE_VERIFY_INTERVAL = int(os.environ.get('PINECONE_VERIFY_INTERVAL', 300))
     EMBEDDING_MODEL_NAME = 'models/text-embedding-004'
+    EMBEDDING_DIM = 768
+    EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 50))
+    EMBEDDING_MAX_IN_FLIGHT = int(os.environ.get('EMBEDDING_MAX_IN_FLIGHT', 4))
+    EMBEDDING_MAX_RETRIES = int(os.environ.get('EMBEDDING_MAX_RETRIES', 3))
+    EMBEDDING_RETRY_BACKOFF = float(os.environ.get('EMBEDDING_RETRY_BACKOFF', 1.0))
+    EMBEDDING_CACHE_ENABLED = os.environ.get('EMBEDDING_CACHE_ENABLED', '1') == '1'
+    EMBEDDING_CACHE_PATH = os.environ.get('EMBEDDING_CACHE_PATH', 'embedding_cache.sqlite3')
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get('EMBEDDING_CACHE_MAX_ENTRIES', 200000))
+    # Opt-in cache of generated sequences keyed by the normalised generation context
+    SEQUENCE_CACHE_ENABLED = os.environ.get('SEQUENCE_CACHE_ENABLED', '0') == '1'
+    SEQUENCE_CACHE_BACKEND = os.environ.get('SEQUENCE_CACHE_BACKEND', 'memory')  # 'memory' or 'sqlite'
+    SEQUENCE_CACHE_PATH = os.environ.get('SEQUENCE_CACHE_PATH', 'sequence_cache.sqlite3')
+    SEQUENCE_CACHE_MAX_ENTRIES = int(os.environ.get('SEQUENCE_CACHE_MAX_ENTRIES', 1000))
+    SEQUENCE_CACHE_TTL = int(os.environ.get('SEQUENCE_CACHE_TTL', 86400))
+    # BM25 index of chunk text (SQLite FTS5), fused with vector results at retrieval
+    LEXICAL_INDEX_ENABLED = os.environ.get('LEXICAL_INDEX_ENABLED', '1') == '1'
+    LEXICAL_INDEX_PATH = os.environ.get('LEXICAL_INDEX_PATH', 'lexical_index.sqlite3')
+    RAG_TOP_K = int(os.environ.get('RAG_TOP_K', 8))  # max chunks in the packed context
+    RAG_CANDIDATES = int(os.environ.get('RAG_CANDIDATES', 30))  # per ranking, before fusion
+    RAG_RRF_K = int(os.environ.get('RAG_RRF_K', 60))
+    # Retrieved chunks are packed into this many tokens, re-ranked with MMR
+    RAG_CONTEXT_TOKEN_BUDGET = int(os.environ.get('RAG_CONTEXT_TOKEN_BUDGET', 2000))
+    RAG_MMR_LAMBDA = float(os.environ.get('RAG_MMR_LAMBDA', 0.7))  # 1.0 = relevance only
+    RAG_DUPLICATE_THRESHOLD = float(os.environ.get('RAG_DUPLICATE_THRESHOLD', 0.9))
+    # Retrieved context is kept per session, outside the message table, and
+    # sent with the next RAG_CONTEXT_TURNS turns while it is fresh
+    RAG_CONTEXT_TURNS = int(os.environ.get('RAG_CONTEXT_TURNS', 3))
+    RAG_CONTEXT_CACHE_BACKEND = os.environ.get('RAG_CONTEXT_CACHE_BACKEND', 'memory')  # 'memory' or 'sqlite'
+    RAG_CONTEXT_CACHE_PATH = os.environ.get('RAG_CONTEXT_CACHE_PATH', 'rag_context_cache.sqlite3')
+    RAG_CONTEXT_CACHE_MAX_ENTRIES = int(os.environ.get('RAG_CONTEXT_CACHE_MAX_ENTRIES', 1000))
+    RAG_CONTEXT_CACHE_TTL = int(os.environ.get('RAG_CONTEXT_CACHE_TTL', 900))
+    # search_documents calls the chat model may make in one turn
+    CHAT_MAX_TOOL_CALLS = int(os.environ.get('CHAT_MAX_TOOL_CALLS', 2))
+    CHUNK_TARGET_TOKENS = int(os.environ.get('CHUNK_TARGET_TOKENS', 256))
+    CHUNK_OVERLAP_TOKENS = int(os.environ.get('CHUNK_OVERLAP_TOKENS', 32))
+
+    # PDFs with at least this many pages are extracted in a process pool
+    PDF_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 50))
+    PDF_EXTRACT_WORKERS = int(os.environ.get('PDF_EXTRACT_WORKERS', 4))
+    PDF_PAGES_PER_TASK = int(os.environ.get('PDF_PAGES_PER_TASK', 16))
+    PDF_EXTRACT_TIMEOUT = int(os.environ.get('PDF_EXTRACT_TIMEOUT', 120))
+
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
+    INGESTION_WORKERS = int(os.environ.get('INGESTION_WORKERS', 2))
+    INGESTION_RESUME_ON_STARTUP = os.environ.get('INGESTION_RESUME_ON_STARTUP', '1') == '1'
+    # A 'running' job with no progress for this long is considered orphaned and is resumed
+    INGESTION_STALE_AFTER = int(os.environ.get('INGESTION_STALE_AFTER', 600))
+    
+    # Chat history sent to the model: recent messages verbatim up to the budget,
+    # older ones folded into a persisted rolling summary
+    HISTORY_TOKEN_BUDGET = int(os.environ.get('HISTORY_TOKEN_BUDGET', 6000))
+    HISTORY_RECENT_TOKENS = int(os.environ.get('HISTORY_RECENT_TOKENS', 3000))
+    HISTORY_SUMMARY_MAX_TOKENS = int(os.environ.get('HISTORY_SUMMARY_MAX_TOKENS', 512))
+    HISTORY_SUMMARY_INPUT_CHARS = int(os.environ.get('HISTORY_SUMMARY_INPUT_CHARS', 4000))
+    # Page size of the message and sequence version history endpoints (?limit= is capped at the max)
+    HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', 100))
+    HISTORY_MAX_PAGE_SIZE = int(os.environ.get('HISTORY_MAX_PAGE_SIZE', 500))
+    
+    CHAT_MODEL_NAME = os.environ.get('CHAT_MODEL_NAME', 'gemini-2.5-flash-preview-04-17')
+    SEQUENCE_MODEL_NAME = os.environ.get('SEQUENCE_MODEL_NAME', 'gemini-2.5-flash-preview-04-17')
+
+    # 'eventlet': run.py monkey-patches the process so Gemini, Pinecone and
+    # database I/O yield to other requests; 'threading': one OS thread per request
+    ASYNC_MODE = os.environ.get('ASYNC_MODE', 'eventlet')
+    # grpc does not cooperate with eventlet's patched sockets; the REST transport does
+    GENAI_TRANSPORT = os.environ.get('GENAI_TRANSPORT', 'rest' if ASYNC_MODE == 'eventlet' else None)
+    GENAI_API_ENDPOINT = os.environ.get('GENAI_API_ENDPOINT')
     
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-key-change-in-production')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URI', 'sqlite:///helix.db')
@@ -1,7 +1,11 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_socketio import SocketIO
+from .services.client_registry import ClientRegistry
+from .services.model_registry import ModelRegistry
 
 db = SQLAlchemy()
 migrate = Migrate()
-socketio = SocketIO()
\ No newline at end of file
+socketio = SocketIO()
+clients = ClientRegistry()
+models = ModelRegistry()
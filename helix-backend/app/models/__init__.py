@@ -2,6 +2,10 @@
 from .messages import Message
 from .sequences import Sequence
 from .session import Session
+from .ingestion_jobs import IngestionJob
+from .documents import Document
+from .prompt_versions import PromptVersion
+from .sequence_versions import SequenceVersion
 
 
-__all__ = ['Message', 'Sequence', 'Session']
\ No newline at end of file
+__all__ = ['Message', 'Sequence', 'Session', 'IngestionJob', 'Document', 'PromptVersion', 'SequenceVersion']
\ No newline at end of file
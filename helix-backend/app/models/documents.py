@@ -0,0 +1,13 @@
+from datetime import datetime
+from ..extensions import db
+
+class Document(db.Model):
+    doc_id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=False, unique=True)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
+    chunk_ids = db.Column(db.JSON, nullable=False, default=list)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Document {self.doc_id} {self.filename}>'
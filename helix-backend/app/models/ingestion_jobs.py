@@ -0,0 +1,34 @@
+from datetime import datetime
+from ..extensions import db
+
+class IngestionJob(db.Model):
+    job_id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(1024), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    pages_extracted = db.Column(db.Integer, nullable=False, default=0)
+    chunks_embedded = db.Column(db.Integer, nullable=False, default=0)
+    vectors_upserted = db.Column(db.Integer, nullable=False, default=0)
+    committed_chunks = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "status": self.status,
+            "pages_extracted": self.pages_extracted,
+            "chunks_embedded": self.chunks_embedded,
+            "vectors_upserted": self.vectors_upserted,
+            "committed_chunks": self.committed_chunks,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+    def __repr__(self):
+        return f'<IngestionJob {self.job_id} {self.status}>'
@@ -2,6 +2,14 @@ from datetime import datetime
 from ..extensions import db
 
 class Message(db.Model):
+    # History reads walk a session in time order, the history API pages
+    # through it by msg_id; the RAG query only wants its latest user messages.
+    __table_args__ = (
+        db.Index('ix_message_session_id_msg_created_at', 'session_id', 'msg_created_at', 'msg_id'),
+        db.Index('ix_message_session_id_msg_id', 'session_id', 'msg_id'),
+        db.Index('ix_message_session_id_msg_role_msg_created_at', 'session_id', 'msg_role', 'msg_created_at'),
+    )
+
     session_id = db.Column(db.Integer, db.ForeignKey('session.s_id'), nullable=False)
     msg_id = db.Column(db.Integer, primary_key=True)
     msg_role = db.Column(db.String(20), nullable=False) 
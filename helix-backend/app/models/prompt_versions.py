@@ -0,0 +1,12 @@
+from datetime import datetime
+from ..extensions import db
+
+class PromptVersion(db.Model):
+    prompt_version_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False, unique=True)
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<PromptVersion {self.prompt_version_id} {self.name}>'
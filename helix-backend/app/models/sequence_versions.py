@@ -0,0 +1,35 @@
+from datetime import datetime
+from ..extensions import db
+
+class SequenceVersion(db.Model):
+    # One row per generation, modification or edit. seq_ids lists the 4
+    # Sequence rows (in message order) that make up this version; Sequence
+    # rows are never changed once written, so versions share unchanged parts
+    # and two versions differ exactly where their seq_ids do.
+    __table_args__ = (
+        db.UniqueConstraint('session_id', 'version_no', name='uq_sequence_version_session_id_version_no'),
+    )
+
+    version_id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('session.s_id'), nullable=False)
+    version_no = db.Column(db.Integer, nullable=False)
+    source = db.Column(db.String(20), nullable=False)
+    instruction = db.Column(db.Text, nullable=True)
+    seq_ids = db.Column(db.JSON, nullable=False)
+    changed_seq_ids = db.Column(db.JSON, nullable=False, default=list)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "version_id": self.version_id,
+            "session_id": self.session_id,
+            "version_no": self.version_no,
+            "source": self.source,
+            "instruction": self.instruction,
+            "seq_ids": self.seq_ids,
+            "changed_seq_ids": self.changed_seq_ids,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+    def __repr__(self):
+        return f'<SequenceVersion {self.version_no} Session {self.session_id}>'
@@ -2,6 +2,10 @@ from datetime import datetime
 from ..extensions import db
 
 class Sequence(db.Model):
+    __table_args__ = (
+        db.Index('ix_sequence_session_id_seq_created_at', 'session_id', 'seq_created_at'),
+    )
+
     session_id = db.Column(db.Integer, db.ForeignKey('session.s_id'), nullable=False)
     seq_id = db.Column(db.Integer, primary_key=True)
     seq_role = db.Column(db.String(50), nullable=False, default='generated')
@@ -5,6 +5,9 @@ class Session(db.Model):
     s_id = db.Column(db.Integer, primary_key=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    history_summary = db.Column(db.Text, nullable=True)
+    summary_upto_msg_id = db.Column(db.Integer, nullable=True)
+    prompt_version_id = db.Column(db.Integer, db.ForeignKey('prompt_version.prompt_version_id'), nullable=True)
     
     messages = db.relationship('Message', backref='session', lazy='dynamic')
     sequences = db.relationship('Sequence', backref='session', lazy='dynamic')
@@ -1,28 +1,31 @@
 # app/services/chat_service.py
 import os
 import json
-import google.generativeai as genai
+import time
+from datetime import datetime
 from flask import current_app
-from ..extensions import db
+from ..extensions import db, clients, models
 from ..models import Session, Message, Sequence
-from ..tools.all_tools import ALL_TOOLS
 from .document_service import DocumentService
+from .history_service import HistoryBuilder
+from .prompt_registry import prompts
+from .retrieval import HybridRetriever
+from .context_packing import ContextPacker
+from .unit_of_work import unit_of_work
+from ..tools.all_tools import SERVER_TOOLS
 
 
-class ChatService:
-    
-    
-    def __init__(self):
-        api_key = current_app.config.get('GOOGLE_API_KEY')
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY not configured in Flask app")
-        genai.configure(api_key=api_key)
-        self.generation_config_params = {
-             "temperature": 0.7, "top_p": 0.95, "top_k": 40, "max_output_tokens": 8192,
-        }
+def chat_room(session_id):
+    return f"chat_session_{session_id}"
+
+
+def retrieval_context_key(session_id):
+    return f"rag_context:{session_id}"
 
 
-        self.system_prompt = """
+class ChatService:
+    # Built once at import; sessions reference it through the prompt registry.
+    system_prompt = """
             # SYSTEM PROMPT: Helix Recruitment Assistant
 
             You are Helix, an expert recruitment assistant chatbot. Your purpose is to engage naturally with users on recruitment topics and assist in crafting personalized outreach emails or message sequences.
@@ -42,6 +45,7 @@ class ChatService:
             ## RAG FETCH MODE
             -  You are also designed to give context aware responses, sometimes the user might ask a questions related to context, check your context and answer accordingly.
             -  If you are unable to provide the answer from the context, convey them your context doen't have the information.
+            -  When the answer depends on the uploaded documents and your context does not already contain it, call `search_documents` with a focused query and answer from the passages it returns. Do not call it for questions that do not need the documents.
             -  Your example questions can be or equal to but not limited to  "Get me the top candidates list or what roles are evailable", "Tell me who's the most qualified applicant", etc. 
                         
             ## Outreach Sequence Creation Mode:
@@ -86,11 +90,21 @@ class ChatService:
             ## INFORMATION OF FUNCTIONS
             - "generate_outreach_sequences_declaration" Creates a 4 recruitment emails with various styles or usecases based on provided job details, company info, selling points, candidate profile, desired tone, and optional context for new sequences.
             - "modify_sequences_declaration" Edits, modifies, or changes, any modification involving existing outreach sequences based on specific user instructions.
+            - "search_documents_declaration" Searches the uploaded documents and returns the most relevant passages, for questions that need them.
             
             
         """
 
-        self.model = genai.GenerativeModel(model_name="gemini-2.5-flash-preview-04-17")
+    def __init__(self):
+        api_key = current_app.config.get('GOOGLE_API_KEY')
+        if not api_key:
+            raise ValueError("GOOGLE_API_KEY not configured in Flask app")
+        # Shared configuration (transport, endpoint) from the client registry;
+        # a bare genai.configure here would reset the transport to grpc.
+        clients.configure_genai()
+        # Shared, long-lived models with generation config and tools attached.
+        self.model = models.chat
+        self.history = HistoryBuilder.from_config(models.summary, current_app.config)
         
         
     # RAG based message generation
@@ -105,46 +119,101 @@ class ChatService:
             return {"status": "warning", "message": "No user messages found for RAG context"}
         
         combined_query = " ".join([msg.msg_content for msg in reversed(recent_messages)])
+        db.session.commit()
         
         try:
-            doc_service = DocumentService()
-            query_embedding = genai.embed_content(
-                model=doc_service.embedding_model_name,
-                content=combined_query,
-                task_type="retrieval_query"
-            )['embedding']
-            
-            query_response = doc_service.index.query(
-                vector=query_embedding,
-                top_k=30,  
-                include_metadata=True
-            )
-            
-            rag_context = []
-            if hasattr(query_response, 'matches') and query_response.matches:
-                for match in query_response.matches:
-                    if hasattr(match, 'metadata') and match.metadata and 'text_preview' in match.metadata:
-                        filename = match.metadata.get('filename', 'unknown')
-                        rag_context.append(f"Document '{filename}': {match.metadata['text_preview']}")
-            
-            if not rag_context:
+            rag_content, refs, stats = self._retrieve_context(combined_query)
+            if rag_content is None:
                 return {"status": "warning", "message": "No relevant documents found"}
             
-            rag_content = "\n\n".join(rag_context)
             system_msg = f"[RAG CONTEXT]\n\nThe following are relevant documents to help with the conversation:\n\n{rag_content}\n\n[END RAG CONTEXT]"
-            
-            self._save_message(session_id, 'model', system_msg)
+            turns = self._attach_retrieval_context(session_id, system_msg, refs)
+            unit_of_work().flush()
             
             return {
                 "status": "success", 
-                "message": "RAG context added successfully", 
-                "doc_count": len(rag_context)
+                "message": f"RAG context attached to the next {turns} messages", 
+                "doc_count": len(refs),
+                **stats
             }
             
         except Exception as e:
             print(f"Error retrieving RAG context: {e}")
             return {"status": "error", "message": f"Failed to retrieve document context: {str(e)}"}
 
+    def _retrieve_context(self, query):
+        # Hybrid retrieval packed into the context budget. Returns
+        # (rendered passages or None, chunk refs, stats).
+        doc_service = DocumentService()
+        retriever = HybridRetriever.from_config(current_app.config, doc_service.embedder, doc_service.store,
+                                                lexical=doc_service.lexical)
+        # Every fused candidate goes to the packer, which keeps at most
+        # RAG_TOP_K of them within the context token budget.
+        matches = retriever.retrieve(query, top_k=current_app.config.get('RAG_CANDIDATES', 30))
+        packer = ContextPacker.from_config(current_app.config)
+        blocks = packer.pack(matches)
+        stats = {"retrieval_stats": retriever.last_stats, "packing_stats": packer.last_stats}
+        if not blocks:
+            return None, [], stats
+        print(f"Packed {packer.last_stats['selected']}/{packer.last_stats['candidates']} chunks into {packer.last_stats['packed_tokens']} tokens "
+              f"({packer.last_stats['tokens_saved']} saved vs. concatenating all candidates).")
+        refs = [{"id": chunk_id, "score": round(score, 6)}
+                for block in blocks for chunk_id, score in zip(block["ids"], block["scores"])]
+        return packer.render(blocks), refs, stats
+
+    def _attach_retrieval_context(self, session_id, context, refs):
+        # The context itself is only cached; the message table records
+        # which chunks were retrieved and how they scored.
+        # expires_at fixes the lifetime at retrieval time; the cache's own
+        # expiry restarts on every set.
+        turns = current_app.config.get('RAG_CONTEXT_TURNS', 3)
+        cache = clients.get_retrieval_context_cache()
+        cache.set(retrieval_context_key(session_id), {
+            "context": context,
+            "refs": refs,
+            "turns_left": turns,
+            "expires_at": time.time() + cache.ttl,
+        })
+        self._save_message(session_id, 'system', f"[RAG REFERENCES] {json.dumps(refs, separators=(',', ':'))}")
+        return turns
+
+    def _search_documents(self, session_id, args):
+        # search_documents, run inside the turn. The passages go back to the
+        # model as the function response and stay attached for follow-ups.
+        query = (args.get("query") or "").strip()
+        if not query:
+            return {"error": "Missing 'query'."}
+        try:
+            rag_content, refs, _ = self._retrieve_context(query)
+        except Exception as e:
+            print(f"Error running search_documents for session {session_id}: {e}")
+            return {"error": "Document search is unavailable right now."}
+        if rag_content is None:
+            return {"passages": "", "note": "No relevant documents found."}
+        system_msg = f"[RAG CONTEXT]\n\nThe following are relevant documents to help with the conversation:\n\n{rag_content}\n\n[END RAG CONTEXT]"
+        self._attach_retrieval_context(session_id, system_msg, refs)
+        return {"passages": rag_content, "refs": refs}
+
+    def _server_tool_call(self, response):
+        # The first function call in the reply that the server executes itself.
+        if not response.candidates or not response.candidates[0].content.parts:
+            return None
+        for part in response.candidates[0].content.parts:
+            if hasattr(part, 'function_call') and part.function_call and part.function_call.name in SERVER_TOOLS:
+                return part.function_call
+        return None
+
+    def _run_server_tool(self, session_id, function_call):
+        # Returns the contents to append to the request: the model's call
+        # and the function response.
+        function_call_data = self._function_call_to_dict(function_call)
+        print(f"Running server-side tool {function_call.name} for session {session_id}: {function_call_data['args']}")
+        result = self._search_documents(session_id, function_call_data["args"])
+        return [
+            {"role": "model", "parts": [{"function_call": function_call_data}]},
+            {"role": "user", "parts": [{"function_response": {"name": function_call.name, "response": result}}]},
+        ]
+
     def _get_or_create_session(self, session_id=None):
         if session_id:
             session = Session.query.get(session_id)
@@ -156,54 +225,152 @@ class ChatService:
         return new_session
 
     def _save_message(self, session_id, role, content):
+        # Queued on the request's unit of work; written at the next flush().
         if not content: return None
-        message = Message(session_id=session_id, msg_role=role, msg_content=content)
-        db.session.add(message)
-        db.session.commit()
-        return message
-
-    def _get_chat_history(self, session_id):
-        messages = Message.query.filter_by(session_id=session_id).order_by(Message.msg_created_at).all()
-        history = []
-        system_prompt_found = False
-
-        if messages and messages[0].msg_role == 'model' and messages[0].msg_content == self.system_prompt:
-            system_prompt_found = True
-
-        if not system_prompt_found:
-             history.append({"role": "model", "parts": [{"text": self.system_prompt}]})
-
-        for msg in messages:
-            if not system_prompt_found and msg.msg_role == 'model' and msg.msg_content == self.system_prompt:
-                 continue
+        return unit_of_work().add(Message(session_id=session_id, msg_role=role, msg_content=content,
+                                          msg_created_at=datetime.utcnow()))
+
+    def get_history(self, session_id, after=None, limit=100):
+        # One page of messages in msg_id order, starting after the `after`
+        # cursor; next_cursor is None on the last page.
+        query = Message.query.with_entities(Message.msg_id, Message.msg_role, Message.msg_content, Message.msg_created_at)\
+                             .filter(Message.session_id == session_id)
+        if after is not None:
+            query = query.filter(Message.msg_id > after)
+        rows = query.order_by(Message.msg_id).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "session_id": session_id,
+            "messages": [
+                {
+                    "msg_id": r.msg_id,
+                    "msg_role": r.msg_role,
+                    "msg_content": r.msg_content,
+                    "msg_created_at": r.msg_created_at.isoformat() if r.msg_created_at else None,
+                }
+                for r in rows
+            ],
+            "next_cursor": rows[-1].msg_id if has_more else None,
+        }
 
-            role = 'user' if msg.msg_role == 'user' else 'model'
-            history.append({"role": role, "parts": [{"text": msg.msg_content}]})
+    def _get_system_prompt(self, session):
+        # Sessions keep the prompt version they were created with.
+        if session.prompt_version_id:
+            content = prompts.get(session.prompt_version_id)
+            if content is not None:
+                return content
+        return self.system_prompt
 
-        return history 
+    def _get_chat_history(self, session_id):
+        session = self._get_or_create_session(session_id)
+        pending = unit_of_work().pending(Message, session_id=session.s_id)
+        history = self.history.build(session, self._get_system_prompt(session), pending=pending)
+        entry = self._retrieval_context(session.s_id)
+        if entry:
+            # Just ahead of the new user message; never written to the table.
+            history.insert(len(history) - 1, {"role": "model", "parts": [{"text": entry["context"]}]})
+        return history, entry
+
+    def _retrieval_context(self, session_id):
+        # Context from the session's last retrieval, for the next
+        # RAG_CONTEXT_TURNS turns until it expires.
+        entry = clients.get_retrieval_context_cache().get(retrieval_context_key(session_id))
+        if not entry or entry["turns_left"] <= 0 or time.time() >= entry.get("expires_at", 0):
+            return None
+        return entry
+
+    def _spend_retrieval_context(self, session_id, used):
+        # Called once the reply has been received, so a failed model call
+        # does not use up a turn. A context that search_documents attached
+        # during this turn replaced `used` and keeps its full count.
+        if used is None:
+            return
+        cache = clients.get_retrieval_context_cache()
+        entry = self._retrieval_context(session_id)
+        if entry is None or entry["expires_at"] != used["expires_at"]:
+            return
+        entry["turns_left"] -= 1
+        cache.set(retrieval_context_key(session_id), entry)
 
     def start_new_chat(self):
         session = self._get_or_create_session()
-        self._save_message(session.s_id, 'model', self.system_prompt)
+        session.prompt_version_id = prompts.register('helix_system', self.system_prompt)
+        db.session.commit()
         return {"session_id": session.s_id}
 
 
+    def _function_call_to_dict(self, function_call):
+        args_dict = {}
+        for key, value in function_call.args.items():
+            if hasattr(value, '__iter__') and not isinstance(value, (str, bytes)):
+                args_dict[key] = [item for item in value]
+            else:
+                args_dict[key] = value
+        return { "name": function_call.name, "args": args_dict }
+
+    def _handle_function_call(self, session_id, function_call):
+        # Returns (ai_message, function_call_data) and stores the placeholder
+        # message; function_call_data is None when the call is rejected.
+        print(f"Detected function call: {function_call.name}") 
+        function_call_data = self._function_call_to_dict(function_call)
+        args_dict = function_call_data["args"]
+
+        if function_call.name == "generate_outreach_sequences":
+            ai_response_text_to_return = "[System: Function call generated. Preparing to generate sequences...]"
+            self._save_message(session_id, 'model', ai_response_text_to_return)
+
+        elif function_call.name in SERVER_TOOLS:
+            # Only reached once CHAT_MAX_TOOL_CALLS is used up.
+            ai_response_text_to_return = "[System: Document search limit reached for this message. Please rephrase your question.]"
+            self._save_message(session_id, 'model', ai_response_text_to_return)
+            function_call_data = None
+
+        elif function_call.name == "modify_sequences":
+            if "modification_instruction" not in args_dict:
+                print("Error: modify_sequences called without required 'modification_instruction' argument!")
+                ai_response_text_to_return = "[System Error: Modification function called incorrectly by AI. Missing instruction.]"
+                self._save_message(session_id, 'model', ai_response_text_to_return)
+                function_call_data = None 
+            else:
+                ai_response_text_to_return = "[System: Modification request received. Preparing to modify sequences...]"
+                self._save_message(session_id, 'model', ai_response_text_to_return)
+
+        else:
+            print(f"Warning: Unexpected function call received: {function_call.name}")
+            ai_response_text_to_return = f"[System: Received unexpected function call '{function_call.name}']"
+            self._save_message(session_id, 'model', ai_response_text_to_return)
+            function_call_data = None
+
+        return ai_response_text_to_return, function_call_data
+
     def send_message(self, session_id, user_message_content):
         session = self._get_or_create_session(session_id)
         self._save_message(session.s_id, 'user', user_message_content)
-        history_for_api = self._get_chat_history(session.s_id)
-        
+        history_for_api, context_used = self._get_chat_history(session.s_id)
+        # End the read transaction so the connection goes back to the pool
+        # for the length of the model call.
+        db.session.commit()
 
-        try:
-             response = self.model.generate_content(
-                 contents=history_for_api,
-                 generation_config=self.generation_config_params,
-                 tools=ALL_TOOLS
-             )
-        except Exception as e:
-             print(f"Error calling Gemini API: {e}")
-             self._save_message(session_id, 'model', f"[Error communicating with AI: {e}]")
-             raise
+        # Server-side tools (search_documents) are run here and their result
+        # sent straight back, so the reply arrives in this same request.
+        max_tool_calls = current_app.config.get('CHAT_MAX_TOOL_CALLS', 2)
+        tool_calls = 0
+        while True:
+            try:
+                 response = self.model.generate_content(
+                     contents=history_for_api
+                 )
+            except Exception as e:
+                 print(f"Error calling Gemini API: {e}")
+                 self._save_message(session_id, 'model', f"[Error communicating with AI: {e}]")
+                 unit_of_work().flush()
+                 raise
+            server_call = self._server_tool_call(response)
+            if server_call is None or tool_calls >= max_tool_calls:
+                break
+            tool_calls += 1
+            history_for_api += self._run_server_tool(session.s_id, server_call)
 
         ai_response_text_to_return = None 
         function_call_data = None     
@@ -212,38 +379,7 @@ class ChatService:
             part = response.candidates[0].content.parts[0]
 
             if hasattr(part, 'function_call') and part.function_call:
-                function_call = part.function_call
-                print(f"Detected function call: {function_call.name}") 
-
-                args_dict = {}
-                for key, value in function_call.args.items():
-                    if hasattr(value, '__iter__') and not isinstance(value, (str, bytes)):
-                        args_dict[key] = [item for item in value]
-                    else:
-                        args_dict[key] = value
-
-                function_call_data = { "name": function_call.name, "args": args_dict }
-
-                if function_call.name == "generate_outreach_sequences":
-                    ai_response_text_to_return = "[System: Function call generated. Preparing to generate sequences...]"
-                    self._save_message(session.s_id, 'model', ai_response_text_to_return)
-                    
-                    
-                elif function_call.name == "modify_sequences":
-                    if "modification_instruction" not in args_dict:
-                        print("Error: modify_sequences called without required 'modification_instruction' argument!")
-                        ai_response_text_to_return = "[System Error: Modification function called incorrectly by AI. Missing instruction.]"
-                        self._save_message(session.s_id, 'model', ai_response_text_to_return)
-                        function_call_data = None 
-                    else:
-                        ai_response_text_to_return = "[System: Modification request received. Preparing to modify sequences...]"
-                        self._save_message(session.s_id, 'model', ai_response_text_to_return)
-                        
-                else:
-                    print(f"Warning: Unexpected function call received: {function_call.name}")
-                    ai_response_text_to_return = f"[System: Received unexpected function call '{function_call.name}']"
-                    self._save_message(session.s_id, 'model', ai_response_text_to_return)
-                    function_call_data = None
+                ai_response_text_to_return, function_call_data = self._handle_function_call(session.s_id, part.function_call)
 
             elif hasattr(part, 'text'):
                 text_content = part.text
@@ -267,8 +403,96 @@ class ChatService:
             print("Warning: No function call and no text content found in response.")
             ai_response_text_to_return = "[System: No valid response content received]"
 
+        self._spend_retrieval_context(session.s_id, context_used)
+        # The user message and the reply are written together.
+        unit_of_work().flush()
         return {
             "session_id": session_id,
             "ai_message": ai_response_text_to_return,
             "function_call": function_call_data 
-        }
\ No newline at end of file
+        }
+
+    def stream_message(self, session_id, user_message_content, emit):
+        # Same turn as send_message, but the model is called in streaming mode
+        # and `emit(event, payload)` receives each text delta as it arrives.
+        # A function call is emitted as soon as it is seen; the reply is
+        # stored once, at the end.
+        session = self._get_or_create_session(session_id)
+        self._save_message(session.s_id, 'user', user_message_content)
+        history_for_api, context_used = self._get_chat_history(session.s_id)
+        db.session.commit()
+
+        started = time.perf_counter()
+        time_to_first_token = None
+        text_parts = []
+        function_call_data = None
+        ai_response_text_to_return = None
+
+        max_tool_calls = current_app.config.get('CHAT_MAX_TOOL_CALLS', 2)
+        tool_calls = 0
+        emit('chat_stream_start', {"session_id": session_id})
+        try:
+            while True:
+                server_call = None
+                response = self.model.generate_content(
+                    contents=history_for_api,
+                    stream=True,
+                )
+                for chunk in response:
+                    if not chunk.candidates or not chunk.candidates[0].content.parts:
+                        continue
+                    for part in chunk.candidates[0].content.parts:
+                        if time_to_first_token is None:
+                            time_to_first_token = time.perf_counter() - started
+                        if hasattr(part, 'function_call') and part.function_call:
+                            if part.function_call.name in SERVER_TOOLS and tool_calls < max_tool_calls:
+                                server_call = part.function_call
+                                break
+                            if text_parts:
+                                # Already streamed to the room as chat_delta; keep it
+                                # in the history so both sides see the same turn.
+                                self._save_message(session.s_id, 'model', "".join(text_parts))
+                            ai_response_text_to_return, function_call_data = self._handle_function_call(session.s_id, part.function_call)
+                            if function_call_data:
+                                emit('chat_function_call', {"session_id": session_id, "function_call": function_call_data})
+                            break
+                        if getattr(part, 'text', None):
+                            text_parts.append(part.text)
+                            emit('chat_delta', {"session_id": session_id, "text": part.text})
+                    if ai_response_text_to_return is not None or server_call is not None:
+                        break
+                if server_call is None:
+                    break
+                # Run the tool, then stream the answer from a second request.
+                tool_calls += 1
+                emit('chat_tool_call', {"session_id": session_id, "name": server_call.name})
+                history_for_api += self._run_server_tool(session.s_id, server_call)
+        except Exception as e:
+            print(f"Error calling Gemini API: {e}")
+            self._save_message(session_id, 'model', f"[Error communicating with AI: {e}]")
+            unit_of_work().flush()
+            emit('chat_error', {"session_id": session_id, "error": "Failed to process message"})
+            raise
+
+        if ai_response_text_to_return is None:
+            ai_response_text_to_return = "".join(text_parts)
+            if ai_response_text_to_return:
+                self._save_message(session.s_id, 'model', ai_response_text_to_return)
+            else:
+                print("Warning: No function call and no text content found in response.")
+                ai_response_text_to_return = "[System: No valid response content received]"
+
+        self._spend_retrieval_context(session.s_id, context_used)
+        unit_of_work().flush()
+        total_seconds = time.perf_counter() - started
+        if time_to_first_token is not None:
+            print(f"Streamed reply for session {session_id}: first token after {time_to_first_token:.2f}s, total {total_seconds:.2f}s.")
+        result = {
+            "session_id": session_id,
+            "ai_message": ai_response_text_to_return,
+            "function_call": function_call_data,
+            "time_to_first_token": time_to_first_token,
+            "total_seconds": total_seconds,
+        }
+        emit('chat_message_complete', result)
+        return result
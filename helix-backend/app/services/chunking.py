@@ -0,0 +1,119 @@
+# app/services/chunking.py
+import re
+from .tokens import estimate_tokens
+
+# A sentence ends at ., ! or ? (plus closing quotes/brackets) followed by
+# whitespace; a blank line ends a paragraph.
+_BOUNDARY = re.compile(r'(?<=[.!?])["\')\]]*\s+|\n\s*\n')
+_PARAGRAPH = re.compile(r'\n\s*\n')
+
+
+class _Unit:
+    __slots__ = ("text", "start", "page", "tokens", "ends_paragraph")
+
+    def __init__(self, text, start, page, ends_paragraph):
+        self.text = text
+        self.start = start
+        self.page = page
+        self.tokens = estimate_tokens(text)
+        self.ends_paragraph = ends_paragraph
+
+
+def _iter_units(pages, max_carry_chars=8192):
+    # Splits a stream of (page_number, text) into sentence units with global
+    # character offsets. A sentence cut by a page break is carried over to the
+    # next page; the carry is bounded so text without punctuation stays linear.
+    offset = 0
+    carry, carry_start, carry_page = "", 0, None
+    for page_number, page_text in pages:
+        if not page_text:
+            continue
+        if not carry:
+            carry_start, carry_page = offset, page_number
+        carried = len(carry)
+        text = carry + page_text
+        offset += len(page_text)
+
+        position = 0
+        for match in _BOUNDARY.finditer(text):
+            end = match.end()
+            if end == len(text):
+                break
+            unit_page = carry_page if position < carried else page_number
+            yield _Unit(text[position:end], carry_start + position, unit_page, bool(_PARAGRAPH.search(match.group())))
+            position = end
+        if position >= carried:
+            carry_page = page_number
+        carry_start += position
+        carry = text[position:]
+        if len(carry) > max_carry_chars:
+            yield _Unit(carry, carry_start, carry_page, False)
+            carry = ""
+    if carry.strip():
+        yield _Unit(carry, carry_start, carry_page, True)
+
+
+def _split_oversized(unit, max_tokens):
+    # A single "sentence" longer than the budget (tables, lists without
+    # punctuation) is cut on whitespace. Pieces are contiguous slices of the
+    # unit, leading whitespace included, so offsets match the source.
+    piece, piece_from = "", 0
+    for match in re.finditer(r'\S+\s*', unit.text):
+        if piece and estimate_tokens(piece + match.group()) > max_tokens:
+            yield _Unit(piece, unit.start + piece_from, unit.page, False)
+            piece_from = match.start()
+        piece = unit.text[piece_from:match.end()]
+    if piece:
+        yield _Unit(piece, unit.start + piece_from, unit.page, unit.ends_paragraph)
+
+
+def iter_structured_chunks(pages, target_tokens=256, overlap_tokens=32, min_paragraph_fill=0.5):
+    # Streaming, linear-time chunker. Chunks are built from whole sentences up
+    # to `target_tokens`, close early at a paragraph break once at least
+    # `min_paragraph_fill` of the budget is used, and start with up to
+    # `overlap_tokens` of trailing sentences from the previous chunk.
+    # Yields dicts with text, char_start/char_end, page_start/page_end, tokens.
+    overlap_tokens = min(overlap_tokens, target_tokens // 2)
+    current, current_tokens = [], 0
+    fresh_units = 0
+
+    def emit():
+        text = "".join(u.text for u in current)
+        stripped = text.strip()
+        char_start = current[0].start + (len(text) - len(text.lstrip()))
+        return {
+            "text": stripped,
+            "char_start": char_start,
+            "char_end": char_start + len(stripped),
+            "page_start": current[0].page,
+            "page_end": current[-1].page,
+            "tokens": estimate_tokens(stripped),
+        }
+
+    def overlap_tail():
+        tail, tail_tokens = [], 0
+        for u in reversed(current):
+            if tail_tokens + u.tokens > overlap_tokens:
+                break
+            tail.insert(0, u)
+            tail_tokens += u.tokens
+        return tail, tail_tokens
+
+    for sentence in _iter_units(pages):
+        units = _split_oversized(sentence, target_tokens) if sentence.tokens > target_tokens else (sentence,)
+        for unit in units:
+            if current and current_tokens + unit.tokens > target_tokens and fresh_units:
+                if "".join(u.text for u in current).strip():
+                    yield emit()
+                current, current_tokens = overlap_tail()
+                while current and current_tokens + unit.tokens > target_tokens:
+                    current_tokens -= current.pop(0).tokens
+                fresh_units = 0
+            current.append(unit)
+            current_tokens += unit.tokens
+            fresh_units += 1
+            if unit.ends_paragraph and current_tokens >= target_tokens * min_paragraph_fill:
+                yield emit()
+                current, current_tokens, fresh_units = [], 0, 0
+    if fresh_units and "".join(u.text for u in current).strip():
+        yield emit()
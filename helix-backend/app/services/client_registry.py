@@ -0,0 +1,158 @@
+# app/services/client_registry.py
+import time
+import threading
+import google.generativeai as genai
+from pinecone import Pinecone
+from .vector_store import PineconeVectorStore
+from .local_vector_store import LocalVectorStore
+from .embedding_cache import EmbeddingCache
+from .result_cache import ResultCache
+from .lexical_index import LexicalIndex
+
+
+class ClientRegistry:
+    # Process-wide holder for the Pinecone / GenAI clients. Set up once in
+    # create_app; request handlers borrow the shared clients from here.
+
+    def __init__(self, app=None):
+        self._lock = threading.RLock()
+        self._pc = None
+        self._index = None
+        self._verified_at = None
+        self._local_store = None
+        self._embedding_cache = None
+        self._sequence_cache = None
+        self._lexical_index = None
+        self._retrieval_context_cache = None
+        self._genai_configured = False
+        self.config = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.config = app.config
+        app.extensions['helix_clients'] = self
+        self.configure_genai()
+        if self.vector_store_backend == 'pinecone' and app.config.get('PINECONE_VERIFY_ON_STARTUP') and app.config.get('PINECONE_API_KEY'):
+            try:
+                self.refresh()
+            except ValueError as e:
+                # Do not block app start-up (migrations, CLI); the next borrow retries.
+                print(f"Warning: Pinecone verification at startup failed: {e}")
+
+    @property
+    def embedding_dim(self):
+        return self.config.get('EMBEDDING_DIM', 768)
+
+    @property
+    def vector_store_backend(self):
+        return self.config.get('VECTOR_STORE_BACKEND', 'pinecone')
+
+    def get_vector_store(self):
+        if self.vector_store_backend == 'local':
+            with self._lock:
+                if self._local_store is None:
+                    self._local_store = LocalVectorStore.from_config(self.config)
+                    print(f"Opened local vector store at '{self._local_store.path}': {self._local_store.describe()}")
+                return self._local_store
+        if self.vector_store_backend == 'pinecone':
+            self.get_index()
+            return PineconeVectorStore(self.get_index)
+        raise ValueError(f"Configuration Error: Unknown VECTOR_STORE_BACKEND '{self.vector_store_backend}'.")
+
+    def get_embedding_cache(self):
+        if not self.config.get('EMBEDDING_CACHE_ENABLED'):
+            return None
+        with self._lock:
+            if self._embedding_cache is None:
+                self._embedding_cache = EmbeddingCache.from_config(self.config)
+            return self._embedding_cache
+
+    def get_sequence_cache(self):
+        if not self.config.get('SEQUENCE_CACHE_ENABLED'):
+            return None
+        with self._lock:
+            if self._sequence_cache is None:
+                self._sequence_cache = ResultCache.from_config(self.config, 'SEQUENCE_CACHE')
+            return self._sequence_cache
+
+    def get_lexical_index(self):
+        if not self.config.get('LEXICAL_INDEX_ENABLED'):
+            return None
+        with self._lock:
+            if self._lexical_index is None:
+                self._lexical_index = LexicalIndex.from_config(self.config)
+            return self._lexical_index
+
+    def get_retrieval_context_cache(self):
+        with self._lock:
+            if self._retrieval_context_cache is None:
+                self._retrieval_context_cache = ResultCache.from_config(self.config, 'RAG_CONTEXT_CACHE')
+            return self._retrieval_context_cache
+
+    def configure_genai(self):
+        with self._lock:
+            if self._genai_configured:
+                return
+            api_key = self.config.get('GOOGLE_API_KEY')
+            if not api_key:
+                return
+            try:
+                options = {}
+                if self.config.get('GENAI_TRANSPORT'):
+                    options['transport'] = self.config.get('GENAI_TRANSPORT')
+                if self.config.get('GENAI_API_ENDPOINT'):
+                    options['client_options'] = {"api_endpoint": self.config.get('GENAI_API_ENDPOINT')}
+                genai.configure(api_key=api_key, **options)
+                self._genai_configured = True
+                print("Configured Google GenAI client.")
+            except Exception as e:
+                print(f"Error configuring Google GenAI: {e}")
+                raise ValueError("Configuration Error: Could not configure Google Generative AI.") from e
+
+    def get_index(self):
+        with self._lock:
+            interval = self.config.get('PINECONE_VERIFY_INTERVAL', 300)
+            stale = self._verified_at is None or (time.monotonic() - self._verified_at) > interval
+            if self._index is None or stale:
+                self._connect_and_verify()
+            return self._index
+
+    def refresh(self):
+        # Explicit hook for when the index is recreated or its dimension changes.
+        with self._lock:
+            if self.vector_store_backend == 'local':
+                self._local_store = None
+                return self.get_vector_store()
+            self._index = None
+            self._verified_at = None
+            self._connect_and_verify()
+            return self._index
+
+    def _connect_and_verify(self):
+        api_key = self.config.get('PINECONE_API_KEY')
+        index_name = self.config.get('PINECONE_INDEX_NAME')
+        if not api_key or not index_name:
+            raise ValueError("Configuration Error: Missing Pinecone API Key/Index.")
+
+        try:
+            if self._pc is None:
+                print("Initializing Pinecone client...")
+                self._pc = Pinecone(api_key=api_key)
+            if self._index is None:
+                self._index = self._pc.Index(index_name, pool_threads=self.config.get('PINECONE_POOL_THREADS', 4))
+
+            index_stats = self._index.describe_index_stats()
+            pinecone_dim = getattr(index_stats, 'dimension', None)
+            if pinecone_dim is None:
+                raise ValueError(f"Could not determine dimension for Pinecone index '{index_name}'. Stats: {index_stats}")
+            if pinecone_dim != self.embedding_dim:
+                raise ValueError(f"Configuration Error: Embedding model dimension ({self.embedding_dim}) for '{self.config.get('EMBEDDING_MODEL_NAME')}' does not match Pinecone index dimension ({pinecone_dim}) for '{index_name}'!")
+            self._verified_at = time.monotonic()
+            print(f"Dimension check passed: Pinecone ({pinecone_dim}) == Embedding Model ({self.embedding_dim}).")
+
+        except Exception as e:
+            self._index = None
+            self._verified_at = None
+            print(f"Fatal Error during Pinecone Initialization/Verification: {e}")
+            raise ValueError(f"Pinecone Error: Could not initialize, connect to, or verify index '{index_name}'. Please check API key, index name, and network connectivity. Original error: {e}") from e
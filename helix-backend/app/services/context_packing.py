@@ -0,0 +1,158 @@
+# app/services/context_packing.py
+import re
+from .tokens import estimate_tokens
+
+_WORD = re.compile(r"\w+")
+
+
+def _terms(text):
+    return frozenset(_WORD.findall(text.lower()))
+
+
+def _similarity(a, b):
+    # Jaccard overlap of word sets: overlapping chunk windows and the same
+    # text uploaded under two filenames score close to 1.
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _match_text(match):
+    # 'text_preview' is the truncated text stored by older ingestions
+    return match.metadata.get('text') or match.metadata.get('text_preview')
+
+
+def render_block(block):
+    chunks = block["chunk_indices"]
+    if len(chunks) > 1:
+        return f"Document '{block['filename']}' (chunks {chunks[0]}-{chunks[-1]}): {block['text']}"
+    return f"Document '{block['filename']}': {block['text']}"
+
+
+class ContextPacker:
+    # Turns ranked retrieval matches into the RAG context block:
+    #  1. maximal marginal relevance picks chunks that are relevant but not
+    #     near-copies of chunks already picked;
+    #  2. picking stops at `token_budget` (or `max_chunks`);
+    #  3. picked chunks that are neighbours in the same file are merged,
+    #     with their overlapping characters written once.
+    # last_stats compares the result with concatenating every match.
+
+    def __init__(self, token_budget=2000, mmr_lambda=0.7, duplicate_threshold=0.9, max_chunks=8):
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.max_chunks = max_chunks
+        self.last_stats = {}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            token_budget=config.get('RAG_CONTEXT_TOKEN_BUDGET', 2000),
+            mmr_lambda=config.get('RAG_MMR_LAMBDA', 0.7),
+            duplicate_threshold=config.get('RAG_DUPLICATE_THRESHOLD', 0.9),
+            max_chunks=config.get('RAG_TOP_K', 8),
+        )
+
+    def pack(self, matches) -> list:
+        candidates = []
+        for rank, match in enumerate(matches):
+            text = _match_text(match)
+            if text:
+                candidates.append({
+                    "match": match,
+                    "rank": rank,
+                    "text": text,
+                    "terms": _terms(text),
+                    "tokens": estimate_tokens(text),
+                })
+        naive_tokens = sum(estimate_tokens(render_block(self._block([c]))) for c in candidates)
+
+        selected, duplicates = self._select(candidates)
+        blocks = self._merge(selected)
+        packed_tokens = sum(estimate_tokens(render_block(b)) for b in blocks)
+        self.last_stats = {
+            "candidates": len(candidates),
+            "selected": len(selected),
+            "duplicates_dropped": duplicates,
+            "blocks": len(blocks),
+            "token_budget": self.token_budget,
+            "naive_tokens": naive_tokens,
+            "packed_tokens": packed_tokens,
+            "tokens_saved": naive_tokens - packed_tokens,
+        }
+        return blocks
+
+    def render(self, blocks):
+        return "\n\n".join(render_block(b) for b in blocks)
+
+    def _select(self, candidates):
+        if not candidates:
+            return [], 0
+        # Relevance is the match score scaled to [0, 1], so it is comparable
+        # with the similarity term whatever the retriever's score range.
+        scores = [c["match"].score for c in candidates]
+        low, high = min(scores), max(scores)
+        for c in candidates:
+            c["relevance"] = (c["match"].score - low) / (high - low) if high > low else 1.0
+
+        selected, duplicates, used = [], 0, 0
+        remaining = list(candidates)
+        while remaining and len(selected) < self.max_chunks:
+            best, best_score = None, None
+            for c in remaining:
+                redundancy = max((_similarity(c["terms"], s["terms"]) for s in selected), default=0.0)
+                c["redundancy"] = redundancy
+                score = self.mmr_lambda * c["relevance"] - (1 - self.mmr_lambda) * redundancy
+                if best is None or score > best_score:
+                    best, best_score = c, score
+            remaining.remove(best)
+            if best["redundancy"] >= self.duplicate_threshold:
+                duplicates += 1
+                continue
+            if used + best["tokens"] > self.token_budget:
+                continue
+            selected.append(best)
+            used += best["tokens"]
+        return selected, duplicates
+
+    def _merge(self, selected):
+        def position(c):
+            return (c["match"].metadata.get("filename", "unknown"), c["match"].metadata.get("chunk_index", -1))
+
+        runs = []
+        for c in sorted(selected, key=position):
+            filename, chunk_index = position(c)
+            if runs and chunk_index >= 0:
+                prev_filename, prev_index = position(runs[-1][-1])
+                if prev_filename == filename and prev_index + 1 == chunk_index:
+                    runs[-1].append(c)
+                    continue
+            runs.append([c])
+        blocks = [self._block(run) for run in runs]
+        # Best chunk first, as the retriever ranked them.
+        blocks.sort(key=lambda b: b["rank"])
+        return blocks
+
+    @staticmethod
+    def _block(run):
+        text = run[0]["text"]
+        for prev, c in zip(run, run[1:]):
+            # Neighbouring chunks share an overlap window; char offsets say how
+            # much. Chunk text is the exact source slice, so the rest of the
+            # next chunk continues where this one ends.
+            prev_meta, meta = prev["match"].metadata, c["match"].metadata
+            overlap = prev_meta.get("char_end", 0) - meta.get("char_start", 0)
+            if "char_start" in meta and "char_end" in prev_meta and 0 < overlap < len(c["text"]):
+                text += c["text"][overlap:]
+            else:
+                text += " " + c["text"]
+        return {
+            "filename": run[0]["match"].metadata.get("filename", "unknown"),
+            "chunk_indices": [c["match"].metadata.get("chunk_index") for c in run],
+            "ids": [c["match"].id for c in run],
+            "scores": [c["match"].score for c in run],
+            "score": max(c["match"].score for c in run),
+            "rank": min(c["rank"] for c in run),
+            "text": text,
+        }
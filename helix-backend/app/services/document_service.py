@@ -3,11 +3,18 @@ import os
 import io
 import json 
 import time 
-from uuid import uuid4
+import codecs
+import hashlib
+import shutil
+import tempfile
 from flask import current_app
-from pinecone import Pinecone 
 from pypdf import PdfReader
 import google.generativeai as genai
+from ..extensions import db, clients
+from ..models import Document
+from .embedding_service import EmbeddingService
+from .pdf_extraction import iter_pages_parallel
+from .chunking import iter_structured_chunks
 
 def split_text_basic(text: str, chunk_size=1000, chunk_overlap=100):
     if not text:
@@ -34,6 +41,12 @@ def split_text_basic(text: str, chunk_size=1000, chunk_overlap=100):
     return [chunk for chunk in chunks if chunk.strip()]
 
 
+def chunk_vector_id(filename, chunk_text):
+    # Deterministic, content-derived ID: re-ingesting the same chunk of the
+    # same file always maps to the same vector.
+    return f"{filename}-{hashlib.sha256(chunk_text.encode('utf-8')).hexdigest()[:32]}"
+
+
 class DocumentService:
     def __init__(self):
         self.pinecone_api_key = current_app.config.get('PINECONE_API_KEY')
@@ -41,165 +54,327 @@ class DocumentService:
         self.embedding_model_name = current_app.config.get('EMBEDDING_MODEL_NAME')
         self.google_api_key = current_app.config.get('GOOGLE_API_KEY')
 
-        if not all([self.pinecone_api_key, self.index_name, self.embedding_model_name, self.google_api_key]):
-            raise ValueError("Configuration Error: Missing Pinecone API Key/Index, Google API Key, or Embedding Model name.")
+        if not all([self.embedding_model_name, self.google_api_key]):
+            raise ValueError("Configuration Error: Missing Google API Key or Embedding Model name.")
+        if clients.vector_store_backend == 'pinecone' and not all([self.pinecone_api_key, self.index_name]):
+            raise ValueError("Configuration Error: Missing Pinecone API Key/Index.")
+
+        clients.configure_genai()
+        self.embedding_dim = clients.embedding_dim
+        self.embedder = EmbeddingService.from_config(current_app.config, cache=clients.get_embedding_cache())
+        self.store = clients.get_vector_store()
+        self.lexical = clients.get_lexical_index()
 
+        print(f"DocumentService initialized successfully. Using Google model '{self.embedding_model_name}' (Dim: {self.embedding_dim}) and '{self.store.name}' vector store.")
+
+
+    def _iter_pdf_pages(self, file_stream, stats):
         try:
-             if not getattr(genai, '_config', None) or not genai._config.api_key:
-                  print("Configuring Google GenAI in DocumentService...")
-                  genai.configure(api_key=self.google_api_key)
-             else:
-                  print("Google GenAI appears already configured.")
+            reader = PdfReader(file_stream)
+            page_count = len(reader.pages)
+            if page_count >= current_app.config.get('PDF_PARALLEL_MIN_PAGES', 50):
+                page_texts = self._iter_pdf_pages_parallel(file_stream, page_count)
+            else:
+                page_texts = (page.extract_text() for page in reader.pages)
+            for page_number, page_text in enumerate(page_texts, start=1):
+                stats["pages"] += 1
+                if page_text:
+                    stats["chars"] += len(page_text) + 1
+                    yield page_number, page_text + "\n"
+            if stats["pages"] != page_count:
+                raise ValueError(f"Processing Error: Extracted {stats['pages']} of {page_count} PDF pages.")
+            stats["complete"] = True
+            print(f"Extracted ~{stats['chars']} chars from {stats['pages']} PDF pages.")
+        except TimeoutError as e:
+            print(f"PDF extraction timed out: {e}")
+            raise ValueError(f"Processing Error: PDF text extraction timed out after {current_app.config.get('PDF_EXTRACT_TIMEOUT')}s. The file may be malformed.") from e
+        except ValueError:
+            raise
         except Exception as e:
-             print(f"Error configuring Google GenAI: {e}")
-             raise ValueError("Configuration Error: Could not configure Google Generative AI.") from e
+            # A partial document must never be indexed as the whole file.
+            print(f"Error reading PDF stream: {e}")
+            raise ValueError(f"Processing Error: Failed to extract text from the PDF (page {stats['pages'] + 1}): {e}") from e
 
-        self.embedding_dim = 768
 
+    def _iter_pdf_pages_parallel(self, file_stream, page_count):
+        # Pool processes re-open the PDF by path, so spool the upload to disk once.
+        config = current_app.config
+        file_stream.seek(0)
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_file:
+            shutil.copyfileobj(file_stream, tmp_file)
+        print(f"Extracting {page_count} PDF pages across {config.get('PDF_EXTRACT_WORKERS')} processes...")
+        try:
+            yield from iter_pages_parallel(
+                tmp_file.name,
+                page_count,
+                max_workers=config.get('PDF_EXTRACT_WORKERS', 4),
+                pages_per_task=config.get('PDF_PAGES_PER_TASK', 16),
+                timeout=config.get('PDF_EXTRACT_TIMEOUT', 120),
+            )
+        finally:
+            os.remove(tmp_file.name)
+
+
+    def _iter_txt_blocks(self, file_stream, stats, block_size=64 * 1024):
         try:
-            print("Initializing Pinecone client...")
-            self.pc = Pinecone(api_key=self.pinecone_api_key)
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            while True:
+                content_bytes = file_stream.read(block_size)
+                text = decoder.decode(content_bytes, final=not content_bytes)
+                if text:
+                    stats["pages"] = 1
+                    stats["chars"] += len(text)
+                    yield None, text
+                if not content_bytes:
+                    break
+            stats["complete"] = True
+            print(f"Extracted {stats['chars']} chars from TXT.")
+        except Exception as e:
+            print(f"Error reading TXT stream: {e}")
+            raise ValueError(f"Processing Error: Failed to read the text file: {e}") from e
 
-            print(f"Checking for Pinecone index '{self.index_name}'...")
-            index_list = self.pc.list_indexes()
-            self.index = self.pc.Index(self.index_name)
-            index_stats = self.index.describe_index_stats()
-            print(f"Successfully connected. Index stats: {index_stats}")
 
-            pinecone_dim = getattr(index_stats, 'dimension', None) 
-            if pinecone_dim is None:
-                 raise ValueError(f"Could not determine dimension for Pinecone index '{self.index_name}'. Stats: {index_stats}")
+    def _iter_chunks(self, pages):
+        chunks = iter_structured_chunks(
+            pages,
+            target_tokens=current_app.config.get('CHUNK_TARGET_TOKENS', 256),
+            overlap_tokens=current_app.config.get('CHUNK_OVERLAP_TOKENS', 32),
+        )
+        for chunk_index, chunk in enumerate(chunks):
+            chunk["chunk_index"] = chunk_index
+            yield chunk
 
-            if pinecone_dim != self.embedding_dim:
-                raise ValueError(f"Configuration Error: Embedding model dimension ({self.embedding_dim}) for '{self.embedding_model_name}' does not match Pinecone index dimension ({pinecone_dim}) for '{self.index_name}'!")
-            print(f"Dimension check passed: Pinecone ({pinecone_dim}) == Embedding Model ({self.embedding_dim}).")
 
+    def _iter_embedded_chunks(self, chunks):
+        try:
+            yield from self.embedder.iter_embeddings(chunks, key=lambda chunk: chunk["text"])
+        except ValueError:
+            # Extraction errors surface here too, since chunks are produced lazily.
+            raise
         except Exception as e:
-            print(f"Fatal Error during Pinecone Initialization/Verification: {e}")
-            raise ValueError(f"Pinecone Error: Could not initialize, connect to, or verify index '{self.index_name}'. Please check API key, index name, and network connectivity. Original error: {e}") from e
-
-        print(f"DocumentService initialized successfully. Using Google model '{self.embedding_model_name}' (Dim: {self.embedding_dim}) and Pinecone index '{self.index_name}'.")
+            print(f"Error generating embeddings with Google API: {e}")
+            raise ValueError("Processing Error: Failed to generate text embeddings using Google API.") from e
 
 
-    def _extract_text_from_pdf(self, file_stream) -> str:
+    def _chunk_metadata(self, filename, chunk):
+        metadata = {
+            "filename": filename,
+            "chunk_index": chunk['chunk_index'],
+            "text": chunk['text'],
+            "char_start": chunk['char_start'],
+            "char_end": chunk['char_end'],
+            "tokens": chunk['tokens'],
+        }
+        # Pinecone rejects null metadata values; TXT files have no pages.
+        if chunk['page_start'] is not None:
+            metadata["page_start"] = chunk['page_start']
+            metadata["page_end"] = chunk['page_end']
+        return metadata
+
+
+    def _index_lexical(self, rows):
+        if self.lexical is None or not rows:
+            return 0
         try:
-            reader = PdfReader(file_stream)
-            text = ""
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-            print(f"Extracted ~{len(text)} chars from PDF.")
-            return text.strip()
+            return self.lexical.upsert(rows)
         except Exception as e:
-            print(f"Error reading PDF stream: {e}")
-            return "" 
-
-
-    def _extract_text_from_txt(self, file_stream) -> str:
+            print(f"Error during lexical index update: {e}")
+            raise ValueError("Database Error: Failed to save document text to the lexical index.") from e
+
+
+    def _backfill_lexical(self, file_stream, file_extension, registered):
+        # Documents ingested before the lexical index existed are re-chunked
+        # (no embedding calls) the next time their unchanged file is uploaded.
+        if self.lexical is None or self.lexical.count(registered.filename):
+            return 0
+        stats = {"pages": 0, "chars": 0}
+        pages = self._iter_pdf_pages(file_stream, stats) if file_extension == '.pdf' else self._iter_txt_blocks(file_stream, stats)
+        known_ids = set(registered.chunk_ids or [])
+        indexed = 0
+        rows = []
+        for chunk in self._iter_chunks(pages):
+            chunk_id = chunk_vector_id(registered.filename, chunk['text'])
+            if chunk_id in known_ids:
+                rows.append((chunk_id, None, self._chunk_metadata(registered.filename, chunk)))
+            if len(rows) >= 500:
+                indexed += self._index_lexical(rows)
+                rows = []
+        indexed += self._index_lexical(rows)
+        print(f"Backfilled {indexed} chunks of '{registered.filename}' into the lexical index.")
+        return indexed
+
+
+    def _upsert_batch(self, batch, batch_number):
         try:
-            content_bytes = file_stream.read()
-            text = content_bytes.decode('utf-8', errors='replace').strip()
-            print(f"Extracted {len(text)} chars from TXT.")
-            return text
+            print(f"  Upserting batch {batch_number} (size: {len(batch)})...")
+            batch_count = self.store.upsert(batch)
+            print(f"  Batch {batch_number} upserted {batch_count} vectors.")
+            return batch_count
         except Exception as e:
-            print(f"Error reading TXT stream: {e}")
-            return "" 
-
-
-    def process_and_upsert(self, file_storage, filename: str):
+            print(f"Error during vector upsert: {e}")
+            raise ValueError(f"Database Error: Failed to save document vectors to the '{self.store.name}' vector store.") from e
+
+
+    def _hash_stream(self, file_stream, block_size=1024 * 1024):
+        digest = hashlib.sha256()
+        file_stream.seek(0)
+        for block in iter(lambda: file_stream.read(block_size), b""):
+            digest.update(block)
+        file_stream.seek(0)
+        return digest.hexdigest()
+
+
+    def _delete_stale_vectors(self, stale_ids, batch_size=1000):
+        for i in range(0, len(stale_ids), batch_size):
+            batch = stale_ids[i:i + batch_size]
+            try:
+                self.store.delete(batch)
+                if self.lexical is not None:
+                    self.lexical.delete(batch)
+                print(f"  Deleted {len(batch)} stale vectors ({i + len(batch)}/{len(stale_ids)}).")
+            except Exception as e:
+                print(f"Error deleting stale vectors: {e}")
+                raise ValueError(f"Database Error: Failed to delete stale document vectors from the '{self.store.name}' vector store.") from e
+
+
+    def process_and_upsert(self, file_storage, filename: str, progress=None, start_chunk=0):
+        # Extraction, chunking, embedding and upsert run as one generator
+        # pipeline, so memory stays flat regardless of document size.
+        # `progress` is called after every upserted batch; `start_chunk` skips
+        # chunks already committed by an interrupted run.
         print(f"Starting processing for file: {filename}")
         _, file_extension = os.path.splitext(filename)
         file_extension = file_extension.lower()
+        if file_extension not in ('.pdf', '.txt'):
+            print(f"Error: Unsupported file type received: {file_extension}")
+            raise ValueError(f"Unsupported file type: {file_extension}")
 
-        text = ""
         file_stream = file_storage.stream 
+        content_hash = self._hash_stream(file_stream)
+        # Only this filename's own content counts as unchanged: the same text
+        # under another name has its own chunk IDs and goes through the
+        # normal replace path below.
+        registered = Document.query.filter_by(filename=filename, content_hash=content_hash).first()
+        if registered:
+            print(f"Skipping {filename}: identical content already indexed.")
+            self._backfill_lexical(file_stream, file_extension, registered)
+            return {
+                "message": f"'{filename}' is already indexed (unchanged content); skipped.",
+                "filename": filename,
+                "vector_count": 0,
+                "skipped": True,
+                "status": "success"
+            }
+
+        document = Document.query.filter_by(filename=filename).first()
+        previous_ids = set(document.chunk_ids) if document else set()
+        # Do not hold a pooled connection open while embedding.
+        db.session.commit()
+
+        extract_stats = {"pages": 0, "chars": 0, "complete": False}
         if file_extension == '.pdf':
-            text = self._extract_text_from_pdf(file_stream)
-        elif file_extension == '.txt':
-            text = self._extract_text_from_txt(file_stream)
+            pages = self._iter_pdf_pages(file_stream, extract_stats)
         else:
-            print(f"Error: Unsupported file type received: {file_extension}")
-            raise ValueError(f"Unsupported file type: {file_extension}")
+            pages = self._iter_txt_blocks(file_stream, extract_stats)
 
-        if not text:
+        print(f"Streaming chunks of {filename} through '{self.embedding_model_name}' into '{self.store.name}' vector store...")
+        upsert_batch_size = 100
+        upserted_count = 0
+        embedded_count = 0
+        batch_number = 0
+        batch = []
+        chunk_ids = []
+        lexical_rows = []
+        retained_count = 0
+
+        def commit_batch():
+            nonlocal upserted_count, batch_number
+            batch_number += 1
+            upserted_count += self._upsert_batch(batch, batch_number)
+            # Lexical rows go in with their vectors, never ahead of them: a
+            # chunk whose upsert failed must not be retrievable by text.
+            self._index_lexical(batch)
+            if progress:
+                progress({
+                    "pages_extracted": extract_stats["pages"],
+                    "chunks_embedded": embedded_count,
+                    "vectors_upserted": upserted_count,
+                    "committed_chunks": batch[-1][2]["chunk_index"] + 1,
+                })
+
+        def new_chunks():
+            # Every chunk from `start_chunk` on is upserted, including those
+            # whose text (and so ID) is already in the index: an edit above
+            # them moves their chunk_index and char offsets, and the packer
+            # merges neighbours by those fields. Their embeddings come from
+            # the embedding cache, so only new text costs API calls. Chunks
+            # committed by an interrupted run are (re)written to the lexical
+            # index only.
+            nonlocal lexical_rows, retained_count
+            seen = set()
+            for chunk in self._iter_chunks(pages):
+                chunk['id'] = chunk_vector_id(filename, chunk['text'])
+                if chunk['id'] in seen:
+                    continue
+                seen.add(chunk['id'])
+                chunk_ids.append(chunk['id'])
+                chunk['metadata'] = self._chunk_metadata(filename, chunk)
+                if chunk['chunk_index'] >= start_chunk:
+                    if chunk['id'] in previous_ids:
+                        retained_count += 1
+                    yield chunk
+                    continue
+                lexical_rows.append((chunk['id'], None, chunk['metadata']))
+                if len(lexical_rows) >= 500:
+                    self._index_lexical(lexical_rows)
+                    lexical_rows = []
+
+        for chunk, embedding in self._iter_embedded_chunks(new_chunks()):
+            embedded_count += 1
+            batch.append((chunk['id'], embedding, chunk['metadata']))
+            if len(batch) >= upsert_batch_size:
+                commit_batch()
+                batch = []
+        if batch:
+            commit_batch()
+        self._index_lexical(lexical_rows)
+
+        # Stale vectors are deleted and the content hash registered only for
+        # a fully extracted file; a partial run must not replace the previous
+        # version or be skipped as "unchanged" on retry.
+        if not extract_stats["complete"]:
+            raise ValueError(f"Processing Error: Text extraction of '{filename}' did not complete; the previous version was kept.")
+
+        if not extract_stats["chars"]:
             print(f"Warning: No text could be extracted from {filename}.")
             return {"message": "No text content found in the file.", "filename": filename, "status": "warning_no_text"}
-
-        print(f"Chunking text (length: {len(text)})...")
-        chunks = split_text_basic(text, chunk_size=1000, chunk_overlap=100) 
-        if not chunks:
+        if not chunk_ids:
             print(f"Warning: Text from {filename} resulted in zero chunks after splitting.")
             return {"message": "Could not process text into meaningful chunks.", "filename": filename, "status": "warning_no_chunks"}
-        print(f"Split into {len(chunks)} chunks.")
-
-        print(f"Generating embeddings for {len(chunks)} chunks using '{self.embedding_model_name}'...")
-        embeddings = []
-        try:
-            for i, chunk in enumerate(chunks):
-                if not chunk.strip(): 
-                     print(f"Skipping empty chunk at index {i}")
-                     continue
-                result = genai.embed_content(
-                    model=self.embedding_model_name,
-                    content=chunk,
-                    task_type="retrieval_document"
-                )
-                embeddings.append(result['embedding'])
-                if (i + 1) % 20 == 0: 
-                     print(f"  Generated embedding for chunk {i+1}/{len(chunks)}")
-            print("Finished generating embeddings.")
-
-        except Exception as e:
-             print(f"Error generating embeddings with Google API: {e}")
-             raise ValueError("Processing Error: Failed to generate text embeddings using Google API.") from e
-
-        if len(embeddings) != len(chunks):
-             print(f"Warning: Number of embeddings ({len(embeddings)}) does not match number of chunks ({len(chunks)}). This might indicate skipped chunks.")
-
-        print("Preparing vectors for Pinecone...")
-        vectors_to_upsert = []
-        valid_chunk_indices = [i for i, chunk in enumerate(chunks) if chunk.strip()]
-        if len(valid_chunk_indices) != len(embeddings):
-             print(f"Error: Mismatch between valid chunks ({len(valid_chunk_indices)}) and generated embeddings ({len(embeddings)}). Aborting upsert.")
-             raise ValueError("Internal Processing Error: Embedding count mismatch.")
-
-        for idx, embedding in enumerate(embeddings):
-            original_chunk_index = valid_chunk_indices[idx]
-            chunk_content = chunks[original_chunk_index]
-            vector_id = f"{filename}-{original_chunk_index}-{uuid4()}" 
-            metadata = {
-                "filename": filename,
-                "chunk_index": original_chunk_index,
-                "text_preview": chunk_content[:500]
-            }
-            vectors_to_upsert.append((vector_id, embedding, metadata))
-
-        batch_size = 100 
-        upserted_count = 0
-        print(f"Upserting {len(vectors_to_upsert)} vectors to Pinecone index '{self.index_name}'...")
-        try:
-            for i in range(0, len(vectors_to_upsert), batch_size):
-                batch = vectors_to_upsert[i:i + batch_size]
-                if not batch: continue
-                print(f"  Upserting batch {i//batch_size + 1} (size: {len(batch)})...")
-                upsert_response = self.index.upsert(vectors=batch)
-                
-                if hasattr(upsert_response, 'upserted_count') and upsert_response.upserted_count is not None:
-                     upserted_count += upsert_response.upserted_count
-                     print(f"  Batch {i//batch_size + 1} upserted {upsert_response.upserted_count} vectors.")
-                else:
-                     print(f"  Batch {i//batch_size + 1} upserted (count not available in response). Assuming {len(batch)}.")
-                     upserted_count += len(batch) 
-
-        except Exception as e:
-            print(f"Error during Pinecone upsert: {e}")
-            raise ValueError(f"Database Error: Failed to save document vectors to Pinecone index '{self.index_name}'.") from e
 
-        print(f"Successfully upserted {upserted_count} vectors for {filename}.")
+        stale_ids = sorted(previous_ids - set(chunk_ids))
+        if stale_ids:
+            print(f"Deleting {len(stale_ids)} stale vectors from the previous version of {filename}...")
+            self._delete_stale_vectors(stale_ids)
+
+        if document is None:
+            document = Document(filename=filename)
+            db.session.add(document)
+        document.content_hash = content_hash
+        document.chunk_ids = chunk_ids
+        db.session.commit()
+
+        # Unchanged: text already indexed, whether re-upserted for its
+        # metadata or committed by an interrupted run.
+        unchanged_count = len(chunk_ids) - upserted_count + retained_count
+        print(f"Successfully upserted {upserted_count} vectors for {filename} ({unchanged_count} unchanged, {len(stale_ids)} stale removed).")
         return {
             "message": f"Successfully processed and indexed '{filename}'.",
             "filename": filename,
+            "doc_id": document.doc_id,
             "vector_count": upserted_count,
+            "unchanged_count": unchanged_count,
+            "deleted_count": len(stale_ids),
+            "embedding_stats": self.embedder.last_stats,
             "status": "success"
-        }
\ No newline at end of file
+        }
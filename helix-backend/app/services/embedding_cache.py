@@ -0,0 +1,124 @@
+# app/services/embedding_cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+
+class EmbeddingCache:
+    # Disk-backed embedding cache keyed by (model, task_type, sha256(text)).
+    # Bounded by entry count; least recently used rows are evicted first.
+
+    def __init__(self, path, max_entries=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_chars = 0
+        self.api_seconds = 0.0
+        self.api_items = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                task_type TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embedding_cache_last_access ON embedding_cache (last_access)")
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            path=config.get('EMBEDDING_CACHE_PATH'),
+            max_entries=config.get('EMBEDDING_CACHE_MAX_ENTRIES', 200000),
+        )
+
+    @staticmethod
+    def make_key(model, task_type, text):
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return f"{model}|{task_type}|{digest}"
+
+    def get_many(self, model, task_type, texts):
+        # Returns a list aligned with `texts`: the cached embedding or None.
+        keys = [self.make_key(model, task_type, t) for t in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embedding_cache SET last_access = ? WHERE key = ?",
+                                       [(now, k) for k in found])
+            results = []
+            for key, text in zip(keys, texts):
+                blob = found.get(key)
+                if blob is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    self.saved_chars += len(text)
+                    results.append(np.frombuffer(blob, dtype=np.float32).tolist())
+        return results
+
+    def put_many(self, model, task_type, texts, embeddings):
+        now = time.time()
+        rows = [
+            (self.make_key(model, task_type, t), model, task_type, np.asarray(e, dtype=np.float32).tobytes(), now)
+            for t, e in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO embedding_cache VALUES (?, ?, ?, ?, ?)", rows)
+                self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embedding_cache WHERE key IN "
+                "(SELECT key FROM embedding_cache ORDER BY last_access LIMIT ?)", (overflow,)
+            )
+
+    def record_api_latency(self, seconds, items):
+        with self._lock:
+            self.api_seconds += seconds
+            self.api_items += items
+
+    def seconds_per_item(self):
+        return (self.api_seconds / self.api_items) if self.api_items else 0.0
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "saved_chars": self.saved_chars,
+                "saved_seconds_estimate": self.hits * self.seconds_per_item(),
+            }
@@ -0,0 +1,138 @@
+# app/services/embedding_service.py
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import google.generativeai as genai
+
+# Gemini caps batchEmbedContents at 100 items per call
+MAX_EMBEDDING_BATCH_SIZE = 100
+
+
+class EmbeddingService:
+    def __init__(self, model_name, batch_size=50, max_in_flight=4, max_retries=3, retry_backoff=1.0, cache=None):
+        if not model_name:
+            raise ValueError("Configuration Error: Missing Embedding Model name.")
+        self.model_name = model_name
+        self.batch_size = max(1, min(int(batch_size), MAX_EMBEDDING_BATCH_SIZE))
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_retries = max(0, int(max_retries))
+        self.retry_backoff = retry_backoff
+        self.cache = cache
+        self.last_stats = None
+
+    @classmethod
+    def from_config(cls, config, cache=None):
+        return cls(
+            model_name=config.get('EMBEDDING_MODEL_NAME'),
+            batch_size=config.get('EMBEDDING_BATCH_SIZE', 50),
+            max_in_flight=config.get('EMBEDDING_MAX_IN_FLIGHT', 4),
+            max_retries=config.get('EMBEDDING_MAX_RETRIES', 3),
+            retry_backoff=config.get('EMBEDDING_RETRY_BACKOFF', 1.0),
+            cache=cache,
+        )
+
+    def embed_query(self, text):
+        if self.cache is not None:
+            cached = self.cache.get_many(self.model_name, "retrieval_query", [text])[0]
+            if cached is not None:
+                return cached
+        embedding = genai.embed_content(model=self.model_name, content=text, task_type="retrieval_query")['embedding']
+        if self.cache is not None:
+            self.cache.put_many(self.model_name, "retrieval_query", [text], [embedding])
+        return embedding
+
+    def embed_documents(self, texts):
+        return [embedding for _, embedding in self.iter_embeddings(texts)]
+
+    def iter_embeddings(self, items, task_type="retrieval_document", key=None):
+        # Yields (item, embedding) pairs in input order; `key` maps an item to
+        # its text. At most `max_in_flight` batches are outstanding at any
+        # time, so `items` can be a lazy iterable.
+        key = key or (lambda item: item)
+        started_at = time.perf_counter()
+        stats = {"chunks": 0, "batches": 0, "retries": 0, "seconds": 0.0, "chunks_per_sec": 0.0,
+                 "cache_hits": 0, "cache_misses": 0, "api_seconds": 0.0, "saved_seconds_estimate": 0.0}
+        self.last_stats = stats
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embed") as executor:
+            pending = deque()
+            for batch in self._batched(items):
+                texts = [key(item) for item in batch]
+                pending.append((batch, executor.submit(self._embed_batch, texts, task_type)))
+                stats["batches"] += 1
+                if len(pending) >= self.max_in_flight:
+                    yield from self._drain_one(pending, stats, started_at)
+            while pending:
+                yield from self._drain_one(pending, stats, started_at)
+
+        if self.cache is not None:
+            stats["saved_seconds_estimate"] = stats["cache_hits"] * self.cache.seconds_per_item()
+        print(f"Embedded {stats['chunks']} chunks in {stats['batches']} batches "
+              f"({stats['retries']} retries) in {stats['seconds']:.2f}s -> {stats['chunks_per_sec']:.1f} chunks/sec "
+              f"[batch_size={self.batch_size}, max_in_flight={self.max_in_flight}, "
+              f"cache hits={stats['cache_hits']} misses={stats['cache_misses']}]")
+
+    def _drain_one(self, pending, stats, started_at):
+        # Batch counters are added here, on the consuming thread; the pool
+        # threads never touch `stats`.
+        batch, future = pending.popleft()
+        embeddings, counters = future.result()
+        for name, value in counters.items():
+            stats[name] += value
+        stats["chunks"] += len(batch)
+        stats["seconds"] = time.perf_counter() - started_at
+        if stats["seconds"] > 0:
+            stats["chunks_per_sec"] = stats["chunks"] / stats["seconds"]
+        yield from zip(batch, embeddings)
+
+    def _batched(self, items):
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _embed_batch(self, batch, task_type):
+        # Returns (embeddings, counters for this batch).
+        counters = {"cache_hits": 0, "cache_misses": 0, "retries": 0, "api_seconds": 0.0}
+        if self.cache is None:
+            counters["cache_misses"] += len(batch)
+            return self._call_api(batch, task_type, counters), counters
+
+        embeddings = self.cache.get_many(self.model_name, task_type, batch)
+        missing = [i for i, e in enumerate(embeddings) if e is None]
+        counters["cache_hits"] += len(batch) - len(missing)
+        counters["cache_misses"] += len(missing)
+        if missing:
+            fresh = self._call_api([batch[i] for i in missing], task_type, counters)
+            self.cache.put_many(self.model_name, task_type, [batch[i] for i in missing], fresh)
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+        return embeddings, counters
+
+    def _call_api(self, batch, task_type, counters):
+        attempt = 0
+        while True:
+            try:
+                started_at = time.perf_counter()
+                result = genai.embed_content(model=self.model_name, content=batch, task_type=task_type)
+                embeddings = result['embedding']
+                if len(embeddings) != len(batch):
+                    raise ValueError(f"Expected {len(batch)} embeddings, got {len(embeddings)}")
+                elapsed = time.perf_counter() - started_at
+                counters["api_seconds"] += elapsed
+                if self.cache is not None:
+                    self.cache.record_api_latency(elapsed, len(batch))
+                return embeddings
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    print(f"Embedding batch of {len(batch)} failed after {attempt + 1} attempts: {e}")
+                    raise
+                attempt += 1
+                counters["retries"] += 1
+                delay = self.retry_backoff * (2 ** (attempt - 1))
+                print(f"Embedding batch of {len(batch)} failed ({e}). Retry {attempt}/{self.max_retries} in {delay:.1f}s...")
+                time.sleep(delay)
@@ -0,0 +1,130 @@
+# app/services/history_service.py
+from ..extensions import db
+from ..models import Message
+from .tokens import estimate_tokens
+
+SUMMARY_PROMPT = """
+You maintain the running summary of a conversation between a recruiter and Helix, a recruitment assistant.
+Update the existing summary with the new messages below. Keep every fact that later turns may rely on:
+the target role, company context, key selling points, candidate persona, desired tone, names, decisions,
+requests for outreach sequences and how they were modified, and any document facts that were discussed.
+Drop greetings and small talk. Write plain prose or short bullet points, at most {max_words} words.
+
+## Existing summary
+{summary}
+
+## New messages
+{messages}
+
+## Updated summary
+"""
+
+
+class HistoryBuilder:
+    # Builds the contents for generate_content within a token budget. Recent
+    # messages are sent verbatim; once the unsummarised messages exceed
+    # `token_budget`, the oldest ones are folded into Session.history_summary
+    # until `recent_tokens` remain, and Session.summary_upto_msg_id records
+    # how far the summary reaches. Messages at or below that id are never
+    # loaded again, so a turn costs about the same however long the session is.
+
+    def __init__(self, model, token_budget=6000, recent_tokens=3000, summary_max_tokens=512,
+                 summary_input_chars=4000):
+        self.model = model
+        self.token_budget = token_budget
+        self.recent_tokens = min(recent_tokens, token_budget)
+        self.summary_max_tokens = summary_max_tokens
+        self.summary_input_chars = summary_input_chars
+
+    @classmethod
+    def from_config(cls, model, config):
+        return cls(
+            model,
+            token_budget=config.get('HISTORY_TOKEN_BUDGET', 6000),
+            recent_tokens=config.get('HISTORY_RECENT_TOKENS', 3000),
+            summary_max_tokens=config.get('HISTORY_SUMMARY_MAX_TOKENS', 512),
+            summary_input_chars=config.get('HISTORY_SUMMARY_INPUT_CHARS', 4000),
+        )
+
+    def build(self, session, system_prompt, pending=()):
+        # `pending`: this turn's messages that are not committed yet. They
+        # count towards the budget but are never folded. 'system' rows are
+        # bookkeeping (retrieval references) and are never sent or summarised.
+        stored = self._unsummarised(session)
+        messages = stored + [m for m in pending if m.msg_role != 'system']
+        tokens = [estimate_tokens(m.msg_content) for m in messages]
+
+        if sum(tokens) > self.token_budget:
+            keep_from = min(self._keep_from(tokens, self.recent_tokens), len(stored))
+            folded = messages[:keep_from]
+            if self._fold(session, folded):
+                messages, tokens = messages[keep_from:], tokens[keep_from:]
+            else:
+                # Summariser unavailable: send what fits and retry the fold next turn.
+                keep_from = self._keep_from(tokens, self.token_budget)
+                messages, tokens = messages[keep_from:], tokens[keep_from:]
+
+        history = [{"role": "model", "parts": [{"text": system_prompt}]}]
+        if session.history_summary:
+            history.append({"role": "model", "parts": [{"text": f"[CONVERSATION SUMMARY]\n{session.history_summary}\n[END CONVERSATION SUMMARY]"}]})
+        for msg in messages:
+            role = 'user' if msg.msg_role == 'user' else 'model'
+            history.append({"role": role, "parts": [{"text": msg.msg_content}]})
+        return history
+
+    def _unsummarised(self, session):
+        # Plain rows rather than ORM objects: they stay readable after the
+        # commit in _fold and skip identity-map bookkeeping.
+        query = Message.query.with_entities(Message.msg_id, Message.msg_role, Message.msg_content)\
+                             .filter_by(session_id=session.s_id)\
+                             .filter(Message.msg_role != 'system')
+        if session.summary_upto_msg_id:
+            query = query.filter(Message.msg_id > session.summary_upto_msg_id)
+        return query.order_by(Message.msg_created_at, Message.msg_id).all()
+
+    @staticmethod
+    def _keep_from(tokens, budget):
+        # Index of the oldest message that still fits in `budget` counting
+        # back from the newest. The newest message is always kept.
+        total = 0
+        for i in range(len(tokens) - 1, -1, -1):
+            total += tokens[i]
+            if total > budget and i < len(tokens) - 1:
+                return i + 1
+        return 0
+
+    def _fold(self, session, messages):
+        if not messages:
+            return True
+        transcript = "\n\n".join(
+            f"{'User' if m.msg_role == 'user' else 'Helix'}: {self._clip(m.msg_content)}" for m in messages
+        )
+        prompt = SUMMARY_PROMPT.format(
+            max_words=int(self.summary_max_tokens * 0.75),
+            summary=session.history_summary or "(none yet)",
+            messages=transcript,
+        )
+        session_id = session.s_id
+        # No pooled connection is held while the summariser runs.
+        db.session.commit()
+        try:
+            response = self.model.generate_content(prompt)
+            summary = (response.text or "").strip()
+        except Exception as e:
+            print(f"Warning: Could not summarise history for session {session_id}: {e}")
+            return False
+        if not summary:
+            return False
+
+        session.history_summary = summary
+        session.summary_upto_msg_id = messages[-1].msg_id
+        db.session.commit()
+        print(f"Folded {len(messages)} messages into the summary for session {session_id}.")
+        return True
+
+    def _clip(self, text):
+        # RAG context blobs can be many thousands of characters; the summary
+        # only needs their gist.
+        if len(text) <= self.summary_input_chars:
+            return text
+        return text[:self.summary_input_chars] + " [...]"
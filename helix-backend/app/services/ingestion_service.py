@@ -0,0 +1,139 @@
+# app/services/ingestion_service.py
+import os
+from uuid import uuid4
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import or_, and_
+from werkzeug.datastructures import FileStorage
+from ..extensions import db, socketio
+from ..models import IngestionJob
+from .document_service import DocumentService
+
+
+def job_room(job_id):
+    return f"ingestion_job_{job_id}"
+
+
+class IngestionManager:
+    # Runs document ingestion outside the request. Jobs are persisted in the
+    # ingestion_job table with the number of committed chunks, so work that
+    # was interrupted by a restart resumes from the last upserted batch.
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._resumed = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['helix_ingestion'] = self
+        self._executor = ThreadPoolExecutor(max_workers=app.config.get('INGESTION_WORKERS', 2), thread_name_prefix="ingest")
+        if app.config.get('INGESTION_RESUME_ON_STARTUP'):
+            # Deferred to the first request so CLI commands (flask db upgrade)
+            # never pick up jobs.
+            app.before_request(self._resume_once)
+
+    def _resume_once(self):
+        if not self._resumed:
+            self._resumed = True
+            self.resume_pending()
+
+    def submit(self, file_storage, filename):
+        upload_folder = self.app.config.get('UPLOAD_FOLDER')
+        os.makedirs(upload_folder, exist_ok=True)
+        file_path = os.path.join(upload_folder, f"{uuid4().hex}_{filename}")
+        file_storage.save(file_path)
+
+        job = IngestionJob(filename=filename, file_path=file_path, status='queued')
+        db.session.add(job)
+        db.session.commit()
+        print(f"Queued ingestion job {job.job_id} for {filename}.")
+        self._executor.submit(self._run, job.job_id)
+        return job
+
+    def resume_pending(self):
+        with self.app.app_context():
+            try:
+                jobs = IngestionJob.query.filter(self._claimable()).all()
+            except Exception as e:
+                # e.g. the table does not exist yet because migrations have not run
+                print(f"Warning: Could not look up pending ingestion jobs: {e}")
+                db.session.rollback()
+                return
+            for job in jobs:
+                print(f"Resuming ingestion job {job.job_id} ({job.filename}) from chunk {job.committed_chunks}.")
+                self._executor.submit(self._run, job.job_id)
+
+    def _claimable(self):
+        stale_before = datetime.utcnow() - timedelta(seconds=self.app.config.get('INGESTION_STALE_AFTER', 600))
+        return or_(
+            IngestionJob.status == 'queued',
+            and_(IngestionJob.status == 'running', IngestionJob.updated_at < stale_before),
+        )
+
+    def _claim(self, job_id):
+        # Conditional update so only one worker/process picks up a job.
+        claimed = IngestionJob.query.filter(IngestionJob.job_id == job_id, self._claimable())\
+                                    .update({"status": "running", "updated_at": datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    def _emit(self, job):
+        try:
+            socketio.emit('ingestion_progress', job.to_dict(), to=job_room(job.job_id))
+        except Exception as e:
+            print(f"Warning: Could not emit progress for ingestion job {job.job_id}: {e}")
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                if not self._claim(job_id):
+                    return
+                job = db.session.get(IngestionJob, job_id)
+                self._emit(job)
+                base_embedded = job.chunks_embedded
+                base_upserted = job.vectors_upserted
+
+                def on_progress(progress):
+                    job.pages_extracted = progress["pages_extracted"]
+                    job.chunks_embedded = base_embedded + progress["chunks_embedded"]
+                    job.vectors_upserted = base_upserted + progress["vectors_upserted"]
+                    job.committed_chunks = progress["committed_chunks"]
+                    db.session.commit()
+                    self._emit(job)
+
+                with open(job.file_path, 'rb') as f:
+                    result = DocumentService().process_and_upsert(
+                        FileStorage(stream=f, filename=job.filename),
+                        job.filename,
+                        progress=on_progress,
+                        start_chunk=job.committed_chunks,
+                    )
+                job.result = result
+                if result.get("status") == "success":
+                    job.status = 'completed'
+                    job.vectors_upserted = base_upserted + result.get("vector_count", 0)
+                else:
+                    job.status = 'failed'
+                    job.error = result.get("message")
+            except Exception as e:
+                print(f"Error in ingestion job {job_id}: {e}")
+                db.session.rollback()
+                job = db.session.get(IngestionJob, job_id)
+                if job is None:
+                    return
+                job.status = 'failed'
+                job.error = str(e)
+
+            db.session.commit()
+            print(f"Ingestion job {job_id} finished with status '{job.status}'.")
+            self._emit(job)
+            try:
+                os.remove(job.file_path)
+            except OSError:
+                pass
+
+
+ingestion = IngestionManager()
@@ -0,0 +1,135 @@
+# app/services/json_stream.py
+import re
+import json
+
+_SEQUENCES_KEY = re.compile(r'"sequences"\s*:\s*\[')
+_WHITESPACE = " \t\r\n"
+
+
+class SequenceStreamParser:
+    # Incremental parser for a model reply of the form {"sequences": [...]}.
+    # feed() takes text as it streams in and returns the array elements that
+    # closed in it, so callers can act on the first element long before the
+    # reply ends. Prose or a ```json fence around the object is skipped;
+    # every character is scanned once.
+
+    def __init__(self):
+        self.text = ""          # full reply, for error reporting
+        self._buf = ""          # unconsumed text
+        self._state = "seek"    # seek -> array -> done
+        self._seek_from = 0
+        self._pos = 0           # scanned prefix of _buf (an open element)
+        self._elements = 0
+        self._in_element = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def done(self):
+        return self._state == "done"
+
+    def feed(self, text):
+        if not text:
+            return []
+        self.text += text
+        self._buf += text
+        if self._state == "seek":
+            match = _SEQUENCES_KEY.search(self._buf, self._seek_from)
+            if match is None:
+                # The key may be split across chunks; rescan only its length.
+                self._seek_from = max(0, len(self._buf) - 64)
+                return []
+            self._buf = self._buf[match.end():]
+            self._state = "array"
+        if self._state == "array":
+            return self._scan()
+        return []
+
+    def finish(self):
+        # Called once the stream ends. If the wrapper key never appeared,
+        # fall back to the first JSON object or array in the reply.
+        if self._state == "array":
+            raise ValueError("Incomplete JSON response from AI: 'sequences' array was not closed.")
+        if self._state == "done":
+            return []
+        value = self._find_sequences(self.text)
+        if value is None:
+            raise ValueError("Failed to decode JSON response from AI.")
+        self._state = "done"
+        self._elements = len(value)
+        return value
+
+    def _scan(self):
+        completed = []
+        buf = self._buf
+        start = 0 if self._in_element else None
+        i = self._pos
+        while i < len(buf):
+            c = buf[i]
+            if not self._in_element:
+                if c in _WHITESPACE or c == ",":
+                    i += 1
+                    continue
+                if c == "]":
+                    self._state = "done"
+                    self._buf = ""
+                    self._pos = 0
+                    return completed
+                self._in_element = True
+                start = i
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 0:
+                        completed.append(self._decode(buf[start:i + 1]))
+                        self._in_element = False
+            elif c == '"':
+                self._in_string = True
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.append(self._decode(buf[start:i + 1]))
+                    self._in_element = False
+            elif self._depth == 0 and (c in ",]" or c in _WHITESPACE):
+                # End of a bare scalar (number, true, null); re-read c.
+                completed.append(self._decode(buf[start:i]))
+                self._in_element = False
+                continue
+            i += 1
+        if self._in_element:
+            self._buf, self._pos = buf[start:], len(buf) - start
+        else:
+            self._buf, self._pos = "", 0
+        return completed
+
+    def _decode(self, raw):
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Failed to decode sequence {self._elements + 1} from AI response.") from e
+        self._elements += 1
+        return value
+
+    @staticmethod
+    def _find_sequences(text):
+        # A {"sequences": [...]} object anywhere in the text wins; otherwise
+        # the first bare JSON array.
+        decoder = json.JSONDecoder()
+        first_list = None
+        for match in re.finditer(r"[\[{]", text):
+            try:
+                value, _ = decoder.raw_decode(text, match.start())
+            except json.JSONDecodeError:
+                continue
+            if isinstance(value, dict) and isinstance(value.get("sequences"), list):
+                return value["sequences"]
+            if isinstance(value, list) and first_list is None:
+                first_list = value
+        return first_list
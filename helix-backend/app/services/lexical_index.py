@@ -0,0 +1,94 @@
+# app/services/lexical_index.py
+import os
+import re
+import json
+import sqlite3
+import threading
+from .vector_store import VectorMatch
+
+# Query terms: words, keeping joined identifiers such as "REQ-1042" or
+# "node.js" together so they match as a phrase.
+_TERM = re.compile(r"\w+(?:[-./+#]\w+)*")
+
+
+class LexicalIndex:
+    # BM25 inverted index of chunk text in a SQLite FTS5 table, next to the
+    # vector store. Rows carry the same id and metadata as the chunk's
+    # vector, so a lexical hit can be used without a vector store lookup.
+
+    def __init__(self, path, max_query_terms=64):
+        self.path = path
+        self.max_query_terms = max_query_terms
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunk_fts USING fts5(
+                chunk_id UNINDEXED,
+                filename UNINDEXED,
+                metadata UNINDEXED,
+                text,
+                tokenize = 'porter unicode61'
+            )
+        """)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get('LEXICAL_INDEX_PATH'))
+
+    def upsert(self, vectors) -> int:
+        # Same (id, values, metadata) tuples as VectorStore.upsert; values are ignored.
+        rows = [(vector_id, metadata.get("filename"), json.dumps(metadata), metadata.get("text") or "")
+                for vector_id, _, metadata in vectors]
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("DELETE FROM chunk_fts WHERE chunk_id = ?", [(r[0],) for r in rows])
+                self._conn.executemany(
+                    "INSERT INTO chunk_fts (chunk_id, filename, metadata, text) VALUES (?, ?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def delete(self, ids) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunk_fts WHERE chunk_id = ?", [(i,) for i in ids])
+
+    def count(self, filename) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunk_fts WHERE filename = ?", (filename,)).fetchone()[0]
+
+    def match_expression(self, query):
+        # Every term as a quoted phrase, OR-ed: FTS5 operators and
+        # punctuation in user text can never break the query.
+        terms, seen = [], set()
+        for term in _TERM.findall(query.lower()):
+            if term not in seen:
+                seen.add(term)
+                terms.append('"' + term.replace('"', '""') + '"')
+        return " OR ".join(terms[:self.max_query_terms])
+
+    def search(self, query, top_k=10) -> list:
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id, metadata, bm25(chunk_fts) AS rank FROM chunk_fts "
+                "WHERE chunk_fts MATCH ? ORDER BY rank LIMIT ?",
+                (expression, top_k),
+            ).fetchall()
+        # bm25() is lower-is-better; flip it so higher scores rank first as in VectorMatch.
+        return [VectorMatch(id=chunk_id, score=-rank, metadata=json.loads(metadata)) for chunk_id, metadata, rank in rows]
+
+    def describe(self) -> dict:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM chunk_fts").fetchone()[0]
+        return {"backend": "sqlite-fts5", "path": self.path, "chunk_count": count}
@@ -0,0 +1,391 @@
+# app/services/local_vector_store.py
+import os
+import json
+import mmap
+import hashlib
+import threading
+import numpy as np
+from .vector_store import VectorStore, VectorMatch, matches_filter
+
+# On-disk layout (one directory per store):
+#   manifest.json              dimension, metric and the list of live segments
+#   tombstones.jsonl           {"id": ..., "upto": N}: rows for id in segments <= N are dead
+#   seg-000001.f32             float32 matrix, rows x dimension, opened with np.memmap
+#   seg-000001.meta.jsonl      one {"id", "metadata"} record per row
+#   seg-000001.offsets         uint64 byte offsets into meta.jsonl (rows + 1)
+#   seg-000001.hashes          sorted uint64 id hashes, for "is this id in the segment?"
+#   seg-000001.ivf.npz         optional IVF lists (centroids, row order, list offsets)
+#
+# Segments are immutable once written; upserts append a new segment and
+# overwrites/deletes are recorded as tombstones. Only the manifest, the
+# tombstones and IVF centroids are held in memory, so large stores open
+# without reading the vectors. A single writer process is assumed; other
+# processes pick up new segments when the manifest changes.
+
+MANIFEST_NAME = "manifest.json"
+TOMBSTONES_NAME = "tombstones.jsonl"
+
+
+def _id_hash(vector_id):
+    return int.from_bytes(hashlib.sha1(vector_id.encode('utf-8')).digest()[:8], 'little')
+
+
+class _Segment:
+    def __init__(self, root, name, number, rows, dimension):
+        self.name = name
+        self.number = number
+        self.rows = rows
+        base = os.path.join(root, name)
+        self.vectors = np.memmap(base + ".f32", dtype=np.float32, mode="r", shape=(rows, dimension))
+        self.offsets = np.memmap(base + ".offsets", dtype=np.uint64, mode="r", shape=(rows + 1,))
+        self.hashes = np.memmap(base + ".hashes", dtype=np.uint64, mode="r", shape=(rows,))
+        with open(base + ".meta.jsonl", "rb") as f:
+            self._meta = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.ivf = None
+        if os.path.exists(base + ".ivf.npz"):
+            ivf = np.load(base + ".ivf.npz")
+            self.ivf = (ivf["centroids"], ivf["order"], ivf["list_offsets"])
+
+    def record(self, row):
+        return json.loads(self._meta[int(self.offsets[row]):int(self.offsets[row + 1])])
+
+    def contains(self, vector_id):
+        h = np.uint64(_id_hash(vector_id))
+        i = int(np.searchsorted(self.hashes, h))
+        return i < self.rows and self.hashes[i] == h
+
+    def top_candidates(self, query, k, nprobe, block_rows):
+        # Returns (scores, rows) for up to k best rows, best first.
+        if self.ivf is not None and nprobe:
+            centroids, order, list_offsets = self.ivf
+            probe = np.argsort(-(centroids @ query))[:nprobe]
+            rows = np.sort(np.concatenate([order[list_offsets[l]:list_offsets[l + 1]] for l in probe]))
+            blocks = ((rows[i:i + block_rows], self.vectors[rows[i:i + block_rows]]) for i in range(0, len(rows), block_rows))
+        else:
+            blocks = ((np.arange(i, min(i + block_rows, self.rows)), self.vectors[i:i + block_rows]) for i in range(0, self.rows, block_rows))
+
+        best_scores = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+        for block_row_ids, block in blocks:
+            scores = block @ query
+            best_scores = np.concatenate([best_scores, scores])
+            best_rows = np.concatenate([best_rows, block_row_ids])
+            if len(best_scores) > k:
+                keep = np.argpartition(-best_scores, k)[:k]
+                best_scores, best_rows = best_scores[keep], best_rows[keep]
+        order = np.argsort(-best_scores)
+        return best_scores[order], best_rows[order]
+
+
+class _SegmentWriter:
+    def __init__(self, root, number, dimension, name=None):
+        self.root = root
+        self.number = number
+        self.name = name or f"seg-{number:06d}"
+        self.dimension = dimension
+        self.rows = 0
+        self._base = os.path.join(root, self.name)
+        self._vectors = open(self._base + ".f32.tmp", "wb")
+        self._meta = open(self._base + ".meta.jsonl.tmp", "wb")
+        self._offsets = [0]
+        self._hashes = []
+
+    def add(self, ids, matrix, metadatas):
+        self._vectors.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+        for vector_id, metadata in zip(ids, metadatas):
+            line = (json.dumps({"id": vector_id, "metadata": metadata or {}}, separators=(",", ":")) + "\n").encode('utf-8')
+            self._meta.write(line)
+            self._offsets.append(self._offsets[-1] + len(line))
+            self._hashes.append(_id_hash(vector_id))
+        self.rows += len(ids)
+
+    def close(self):
+        self._vectors.close()
+        self._meta.close()
+        np.asarray(self._offsets, dtype=np.uint64).tofile(self._base + ".offsets.tmp")
+        np.sort(np.asarray(self._hashes, dtype=np.uint64)).tofile(self._base + ".hashes.tmp")
+        for suffix in (".f32", ".meta.jsonl", ".offsets", ".hashes"):
+            os.replace(self._base + suffix + ".tmp", self._base + suffix)
+
+
+class LocalVectorStore(VectorStore):
+    name = "local"
+
+    def __init__(self, path, dimension, metric="cosine", ivf_min_rows=50000, nprobe=8,
+                 block_rows=65536, merge_factor=16, merge_max_rows=100000):
+        if metric not in ("cosine", "dotproduct"):
+            raise ValueError(f"Unsupported metric for local vector store: {metric}")
+        self.path = path
+        self.dimension = dimension
+        self.metric = metric
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self.block_rows = block_rows
+        self.merge_factor = merge_factor
+        self.merge_max_rows = merge_max_rows
+        self._lock = threading.RLock()
+        self._segments = []
+        self._next_segment = 1
+        self._manifest_mtime = None
+        self._tombstones = {}
+        self._tombstones_read = 0
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            path=config.get('LOCAL_VECTOR_STORE_PATH'),
+            dimension=config.get('EMBEDDING_DIM', 768),
+            metric=config.get('LOCAL_VECTOR_STORE_METRIC', 'cosine'),
+            ivf_min_rows=config.get('LOCAL_VECTOR_STORE_IVF_MIN_ROWS', 50000),
+            nprobe=config.get('LOCAL_VECTOR_STORE_NPROBE', 8),
+        )
+
+    # --- loading -----------------------------------------------------------
+
+    def _load(self):
+        manifest_path = os.path.join(self.path, MANIFEST_NAME)
+        with self._lock:
+            if os.path.exists(manifest_path):
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+                if manifest["dimension"] != self.dimension:
+                    raise ValueError(f"Configuration Error: Embedding model dimension ({self.dimension}) does not match local vector store dimension ({manifest['dimension']}) at '{self.path}'!")
+                if manifest.get("metric", "cosine") != self.metric:
+                    raise ValueError(f"Configuration Error: Local vector store at '{self.path}' uses metric '{manifest.get('metric')}', not '{self.metric}'.")
+                current = {seg.name: seg for seg in self._segments}
+                self._segments = [
+                    current.get(s["name"]) or _Segment(self.path, s["name"], s["number"], s["rows"], self.dimension)
+                    for s in manifest["segments"]
+                ]
+                self._next_segment = manifest["next_segment"]
+                self._manifest_mtime = os.stat(manifest_path).st_mtime_ns
+            else:
+                self._write_manifest()
+            self._load_tombstones()
+
+    def _load_tombstones(self):
+        tombstones_path = os.path.join(self.path, TOMBSTONES_NAME)
+        if not os.path.exists(tombstones_path):
+            return
+        with open(tombstones_path, "rb") as f:
+            f.seek(self._tombstones_read)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._tombstones_read += len(line)
+                entry = json.loads(line)
+                self._tombstones[entry["id"]] = max(entry["upto"], self._tombstones.get(entry["id"], 0))
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(os.path.join(self.path, MANIFEST_NAME)).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._manifest_mtime:
+            self._load()
+
+    def _write_manifest(self):
+        manifest = {
+            "dimension": self.dimension,
+            "metric": self.metric,
+            "next_segment": self._next_segment,
+            "segments": [{"name": s.name, "number": s.number, "rows": s.rows} for s in self._segments],
+        }
+        manifest_path = os.path.join(self.path, MANIFEST_NAME)
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+        self._manifest_mtime = os.stat(manifest_path).st_mtime_ns
+
+    def _append_tombstones(self, ids, upto):
+        if not ids:
+            return
+        with open(os.path.join(self.path, TOMBSTONES_NAME), "ab") as f:
+            for vector_id in ids:
+                line = (json.dumps({"id": vector_id, "upto": upto}) + "\n").encode('utf-8')
+                f.write(line)
+                self._tombstones_read += len(line)
+                self._tombstones[vector_id] = max(upto, self._tombstones.get(vector_id, 0))
+
+    def _is_live(self, vector_id, segment):
+        return self._tombstones.get(vector_id, 0) < segment.number
+
+    # --- writes ------------------------------------------------------------
+
+    def _prepare(self, matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[None, :]
+        if matrix.shape[-1] != self.dimension:
+            raise ValueError(f"Vector dimension {matrix.shape[-1]} does not match local vector store dimension {self.dimension}.")
+        if self.metric == "cosine":
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+        return matrix
+
+    def upsert(self, vectors) -> int:
+        vectors = list(vectors)
+        if not vectors:
+            return 0
+        # Last write wins for duplicate ids within one call.
+        latest = {vector_id: (values, metadata) for vector_id, values, metadata in vectors}
+        ids = list(latest)
+        matrix = self._prepare([latest[i][0] for i in ids])
+
+        with self._lock:
+            self._reload_if_changed()
+            writer = _SegmentWriter(self.path, self._next_segment, self.dimension)
+            writer.add(ids, matrix, [latest[i][1] for i in ids])
+            writer.close()
+            segment = self._open_written(writer)
+
+            overwritten = [i for i in ids if any(s.contains(i) for s in self._segments)]
+            self._append_tombstones(overwritten, segment.number - 1)
+            self._segments = self._segments + [segment]
+            self._next_segment = segment.number + 1
+            self._write_manifest()
+            self._maybe_merge()
+        return len(ids)
+
+    def delete(self, ids) -> None:
+        with self._lock:
+            self._reload_if_changed()
+            if not self._segments:
+                return
+            present = [i for i in ids if any(s.contains(i) for s in self._segments)]
+            self._append_tombstones(present, self._segments[-1].number)
+
+    def _open_written(self, writer):
+        if writer.rows >= self.ivf_min_rows:
+            self._build_ivf(writer)
+        return _Segment(self.path, writer.name, writer.number, writer.rows, self.dimension)
+
+    def _build_ivf(self, writer, iterations=10, sample_size=50000):
+        vectors = np.memmap(os.path.join(self.path, writer.name + ".f32"), dtype=np.float32, mode="r",
+                            shape=(writer.rows, self.dimension))
+        n_lists = int(min(4096, max(8, np.sqrt(writer.rows))))
+        rng = np.random.default_rng(writer.number)
+        sample = np.asarray(vectors[np.sort(rng.choice(writer.rows, size=min(sample_size, writer.rows), replace=False))])
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            if self.metric == "cosine":
+                centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        assignment = np.concatenate([
+            np.argmax(np.asarray(vectors[i:i + self.block_rows]) @ centroids.T, axis=1)
+            for i in range(0, writer.rows, self.block_rows)
+        ])
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        list_offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        np.savez(os.path.join(self.path, writer.name + ".ivf.npz"),
+                 centroids=centroids.astype(np.float32), order=order, list_offsets=list_offsets)
+        del vectors
+
+    def _maybe_merge(self):
+        # Merge the trailing run of small segments so batch-by-batch ingestion
+        # does not leave thousands of tiny files behind.
+        run = []
+        for segment in reversed(self._segments):
+            if segment.rows >= self.merge_max_rows:
+                break
+            run.insert(0, segment)
+        if len(run) >= self.merge_factor:
+            self._merge(run)
+
+    def _merge(self, run):
+        # The merged segment takes the newest number of the run so tombstone
+        # ordering against untouched segments is unchanged.
+        writer = _SegmentWriter(self.path, run[-1].number, self.dimension,
+                                name=f"seg-{run[-1].number:06d}-m{self._next_segment:06d}")
+
+        for segment in run:
+            for start in range(0, segment.rows, self.block_rows):
+                records = [segment.record(row) for row in range(start, min(start + self.block_rows, segment.rows))]
+                live = [j for j, r in enumerate(records) if self._is_live(r["id"], segment)]
+                if live:
+                    block = np.asarray(segment.vectors[start:start + self.block_rows])[live]
+                    writer.add([records[j]["id"] for j in live], block, [records[j]["metadata"] for j in live])
+        writer.close()
+        merged = [self._open_written(writer)] if writer.rows else []
+
+        self._segments = [s for s in self._segments if s not in run] + merged
+        self._next_segment += 1
+        self._write_manifest()
+        self._remove_segment_files(run)
+        if not merged:
+            self._remove_segment_files([writer])
+        print(f"Local vector store: merged {len(run)} segments into {writer.name} ({writer.rows} rows).")
+
+    def _remove_segment_files(self, segments):
+        # Mappings are not closed here: an in-flight query may still hold the
+        # old segment list, and the maps go away with their last reference.
+        for segment in segments:
+            for suffix in (".f32", ".meta.jsonl", ".offsets", ".hashes", ".ivf.npz"):
+                try:
+                    os.remove(os.path.join(self.path, segment.name + suffix))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    # Still mapped by a reader on some platforms; leave it for the next compaction.
+                    print(f"Warning: could not remove {segment.name}{suffix}: {e}")
+
+    def compact(self):
+        with self._lock:
+            self._reload_if_changed()
+            if self._segments:
+                self._merge(list(self._segments))
+            self._tombstones = {}
+            self._tombstones_read = 0
+            open(os.path.join(self.path, TOMBSTONES_NAME), "wb").close()
+
+    # --- reads -------------------------------------------------------------
+
+    def query(self, vector, top_k=10, filter=None, include_values=False) -> list:
+        self._reload_if_changed()
+        segments = self._segments
+        if not segments or top_k <= 0:
+            return []
+        query = self._prepare(vector)[0]
+        total_rows = sum(s.rows for s in segments)
+        fetch = top_k * (4 if filter else 1) + min(len(self._tombstones), top_k)
+
+        while True:
+            candidates = []
+            exhausted = True
+            for segment in segments:
+                scores, rows = segment.top_candidates(query, fetch, self.nprobe, self.block_rows)
+                if len(rows) >= fetch:
+                    exhausted = False
+                candidates.extend((float(score), segment, int(row)) for score, row in zip(scores, rows))
+            candidates.sort(key=lambda c: c[0], reverse=True)
+
+            results = []
+            for score, segment, row in candidates:
+                record = segment.record(row)
+                if not self._is_live(record["id"], segment) or not matches_filter(record["metadata"], filter):
+                    continue
+                values = segment.vectors[row].tolist() if include_values else None
+                results.append(VectorMatch(id=record["id"], score=score, metadata=record["metadata"], values=values))
+                if len(results) >= top_k:
+                    return results
+            if exhausted or fetch >= total_rows:
+                return results
+            fetch *= 4
+
+    def describe(self) -> dict:
+        self._reload_if_changed()
+        return {
+            "backend": self.name,
+            "dimension": self.dimension,
+            "metric": self.metric,
+            "segments": len(self._segments),
+            "rows": sum(s.rows for s in self._segments),
+            "tombstones": len(self._tombstones),
+        }
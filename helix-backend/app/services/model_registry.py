@@ -0,0 +1,56 @@
+# app/services/model_registry.py
+import threading
+import google.generativeai as genai
+from ..tools.all_tools import ALL_TOOLS
+
+CHAT_GENERATION_CONFIG = {"temperature": 0.7, "top_p": 0.95, "top_k": 40, "max_output_tokens": 8192}
+SEQUENCE_GENERATION_CONFIG = {"temperature": 0.8, "top_p": 0.95, "top_k": 40, "max_output_tokens": 8192}
+SEQUENCE_MODIFICATION_CONFIG = {"temperature": 0.6, "top_p": 0.95, "top_k": 40, "max_output_tokens": 8192}
+
+
+class ModelRegistry:
+    # Process-wide GenerativeModel instances with their generation config and
+    # tools attached. GenerativeModel converts tools to protos once, in its
+    # constructor, and keeps no per-call state, so one instance per role is
+    # shared by every request; handlers only build the contents.
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._models = {}
+        self.config = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.config = app.config
+        self._models = {}
+        app.extensions['helix_models'] = self
+
+    @property
+    def chat(self):
+        return self._get('chat', self.config.get('CHAT_MODEL_NAME'), CHAT_GENERATION_CONFIG, ALL_TOOLS)
+
+    @property
+    def sequence_generation(self):
+        return self._get('sequence_generation', self.config.get('SEQUENCE_MODEL_NAME'), SEQUENCE_GENERATION_CONFIG)
+
+    @property
+    def sequence_modification(self):
+        return self._get('sequence_modification', self.config.get('SEQUENCE_MODEL_NAME'), SEQUENCE_MODIFICATION_CONFIG)
+
+    @property
+    def summary(self):
+        generation_config = {"temperature": 0.2, "max_output_tokens": self.config.get('HISTORY_SUMMARY_MAX_TOKENS', 512)}
+        return self._get('summary', self.config.get('CHAT_MODEL_NAME'), generation_config)
+
+    def _get(self, role, model_name, generation_config, tools=None):
+        model = self._models.get(role)
+        if model is not None:
+            return model
+        with self._lock:
+            model = self._models.get(role)
+            if model is None:
+                model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config, tools=tools)
+                self._models[role] = model
+                print(f"Created shared '{role}' model ({model_name}).")
+            return model
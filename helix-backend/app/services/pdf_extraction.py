@@ -0,0 +1,95 @@
+# app/services/pdf_extraction.py
+import os
+import sys
+import json
+import time
+import queue
+import threading
+import subprocess
+from ..concurrency import is_green
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf_worker.py")
+
+
+class PageWorker:
+    # One pdf_worker.py child process serving one document. Page ranges are
+    # answered in the order they were submitted; a reader thread moves the
+    # replies into a queue so waiting on them can time out. With `green`
+    # (eventlet) the pipes, reader and queue are cooperative, so extraction
+    # still runs in real processes while the hub keeps serving requests.
+
+    def __init__(self, path, green=False):
+        if green:
+            import eventlet
+            from eventlet.green import subprocess as green_subprocess
+            from eventlet.queue import LightQueue
+            popen, self._replies = green_subprocess.Popen, LightQueue()
+        else:
+            popen, self._replies = subprocess.Popen, queue.Queue()
+        self.process = popen(
+            [sys.executable, WORKER_SCRIPT, path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        if green:
+            eventlet.spawn(self._read)
+        else:
+            threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            self._replies.put(line)
+        self._replies.put(None)
+
+    def submit(self, start, stop):
+        self.process.stdin.write(f"{start} {stop}\n")
+        self.process.stdin.flush()
+
+    def result(self, timeout):
+        # Raises queue.Empty when nothing arrives within `timeout` seconds.
+        line = self._replies.get(timeout=timeout)
+        if line is None:
+            raise RuntimeError(f"PDF extraction worker exited with code {self.process.wait()}")
+        payload = json.loads(line)
+        if "error" in payload:
+            raise RuntimeError(payload["error"])
+        return payload["texts"]
+
+    def kill(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+def iter_pages_parallel(path, page_count, max_workers=4, pages_per_task=16, timeout=120):
+    # Yields page texts in page order. Every document gets its own worker
+    # processes: range i goes to worker i % n with at most two ranges queued
+    # per worker, and all of them are killed once the document is done or
+    # has failed, so a stuck page never affects another upload.
+    # `timeout` bounds the total time spent waiting on the workers. Time the
+    # caller spends between pages (embedding, upserts) does not count.
+    ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+    if not ranges:
+        return
+    workers = [PageWorker(path, green=is_green()) for _ in range(min(max_workers, len(ranges)))]
+    ahead = 2 * len(workers)
+    waited = 0.0
+    try:
+        for i, page_range in enumerate(ranges[:ahead]):
+            workers[i % len(workers)].submit(*page_range)
+        for i in range(len(ranges)):
+            worker = workers[i % len(workers)]
+            started = time.monotonic()
+            try:
+                texts = worker.result(timeout=max(timeout - waited, 0))
+            except queue.Empty:
+                raise TimeoutError(f"PDF extraction exceeded {timeout}s")
+            waited += time.monotonic() - started
+            if i + ahead < len(ranges):
+                worker.submit(*ranges[i + ahead])
+            yield from texts
+    finally:
+        for worker in workers:
+            worker.kill()
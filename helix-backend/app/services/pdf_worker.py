@@ -0,0 +1,30 @@
+# app/services/pdf_worker.py
+#
+# Child process for iter_pages_parallel. Run as a script, not imported
+# through the app package, so it starts without Flask or eventlet. Opens the
+# PDF once, then answers every "start stop" line on stdin with one JSON line
+# holding the text of pages [start, stop), or the error that stopped it.
+import sys
+import json
+from pypdf import PdfReader
+
+
+def main(path):
+    try:
+        reader, open_error = PdfReader(path), None
+    except Exception as e:
+        reader, open_error = None, f"could not open PDF: {e}"
+    for line in sys.stdin:
+        start, stop = (int(n) for n in line.split())
+        try:
+            if open_error:
+                raise ValueError(open_error)
+            payload = {"texts": [reader.pages[i].extract_text() or "" for i in range(start, stop)]}
+        except Exception as e:
+            payload = {"error": str(e) if open_error else f"pages {start + 1}-{stop}: {e}"}
+        sys.stdout.write(json.dumps(payload) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
@@ -0,0 +1,61 @@
+# app/services/prompt_registry.py
+import hashlib
+import threading
+from sqlalchemy.exc import IntegrityError
+from ..extensions import db
+from ..models import PromptVersion
+
+
+def prompt_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class PromptRegistry:
+    # Each distinct prompt text is stored once in prompt_version, keyed by its
+    # sha256. Sessions reference a version id; lookups are served from an
+    # in-process cache since versions are immutable.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids_by_hash = {}
+        self._content_by_id = {}
+
+    def register(self, name, content):
+        # Returns the version id for `content`, creating the row on first use.
+        digest = prompt_hash(content)
+        with self._lock:
+            version_id = self._ids_by_hash.get(digest)
+        if version_id is not None:
+            return version_id
+
+        version = PromptVersion.query.filter_by(content_hash=digest).first()
+        if version is None:
+            version = PromptVersion(name=name, content_hash=digest, content=content)
+            db.session.add(version)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Another worker registered the same prompt first.
+                db.session.rollback()
+                version = PromptVersion.query.filter_by(content_hash=digest).one()
+        self._remember(version)
+        return version.prompt_version_id
+
+    def get(self, prompt_version_id):
+        with self._lock:
+            content = self._content_by_id.get(prompt_version_id)
+        if content is None:
+            version = db.session.get(PromptVersion, prompt_version_id)
+            if version is None:
+                return None
+            self._remember(version)
+            content = version.content
+        return content
+
+    def _remember(self, version):
+        with self._lock:
+            self._ids_by_hash[version.content_hash] = version.prompt_version_id
+            self._content_by_id[version.prompt_version_id] = version.content
+
+
+prompts = PromptRegistry()
@@ -0,0 +1,142 @@
+# app/services/result_cache.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def make_cache_key(payload):
+    # sha256 of canonical JSON: key order and whitespace do not matter.
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    # Bounded key -> JSON-serialisable value cache with a TTL; the least
+    # recently used entries are evicted first.
+    name = "base"
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+    @staticmethod
+    def from_config(config, prefix):
+        # e.g. prefix='SEQUENCE_CACHE' reads SEQUENCE_CACHE_BACKEND, _TTL, ...
+        backend = config.get(f'{prefix}_BACKEND', 'memory')
+        max_entries = config.get(f'{prefix}_MAX_ENTRIES', 1000)
+        ttl = config.get(f'{prefix}_TTL', 86400)
+        if backend == 'memory':
+            return MemoryResultCache(max_entries=max_entries, ttl=ttl)
+        if backend == 'sqlite':
+            return SQLiteResultCache(config.get(f'{prefix}_PATH'), max_entries=max_entries, ttl=ttl)
+        raise ValueError(f"Configuration Error: Unknown {prefix}_BACKEND '{backend}'.")
+
+
+class MemoryResultCache(ResultCache):
+    # Per-process; lost on restart.
+    name = "memory"
+
+    def __init__(self, max_entries=1000, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"backend": self.name, "entries": len(self._entries), "max_entries": self.max_entries,
+                    "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+class SQLiteResultCache(ResultCache):
+    # Shared by every worker process on the host and survives restarts.
+    name = "sqlite"
+
+    def __init__(self, path, max_entries=1000, ttl=86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS result_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_result_cache_last_access ON result_cache (last_access)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM result_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE result_cache SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("INSERT OR REPLACE INTO result_cache VALUES (?, ?, ?, ?)",
+                                   (key, json.dumps(value), now + self.ttl, now))
+                self._conn.execute("DELETE FROM result_cache WHERE expires_at < ?", (now,))
+                overflow = self._conn.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0] - self.max_entries
+                if overflow > 0:
+                    self._conn.execute(
+                        "DELETE FROM result_cache WHERE key IN "
+                        "(SELECT key FROM result_cache ORDER BY last_access LIMIT ?)", (overflow,)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+            return {"backend": self.name, "entries": entries, "max_entries": self.max_entries,
+                    "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
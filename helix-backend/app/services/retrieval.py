@@ -0,0 +1,63 @@
+# app/services/retrieval.py
+from .vector_store import VectorMatch
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    # Each ranking is a list of ids, best first. An id scores
+    # sum(1 / (k + rank)) over the rankings it appears in, so agreement
+    # between rankings counts for more than a high rank in just one.
+    scores = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever:
+    # Dense (vector store) and lexical (BM25) retrieval fused with RRF.
+    # Each side contributes `candidates` results; only the best `top_k`
+    # fused chunks are returned. Without a lexical index this is plain
+    # dense retrieval truncated to `top_k`.
+
+    def __init__(self, embedder, store, lexical=None, candidates=30, rrf_k=60):
+        self.embedder = embedder
+        self.store = store
+        self.lexical = lexical
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.last_stats = {}
+
+    @classmethod
+    def from_config(cls, config, embedder, store, lexical=None):
+        return cls(
+            embedder,
+            store,
+            lexical=lexical,
+            candidates=config.get('RAG_CANDIDATES', 30),
+            rrf_k=config.get('RAG_RRF_K', 60),
+        )
+
+    def retrieve(self, query, top_k=8) -> list:
+        dense = self.store.query(vector=self.embedder.embed_query(query), top_k=max(self.candidates, top_k))
+        lexical = []
+        if self.lexical is not None:
+            try:
+                lexical = self.lexical.search(query, top_k=max(self.candidates, top_k))
+            except Exception as e:
+                # The lexical side is an enhancement; dense results still stand.
+                print(f"Warning: Lexical search failed, using vector results only: {e}")
+
+        # Dense metadata wins; lexical rows fill in chunks the vector store missed.
+        by_id = {match.id: match for match in lexical}
+        by_id.update({match.id: match for match in dense})
+        fused = reciprocal_rank_fusion([[m.id for m in dense], [m.id for m in lexical]], k=self.rrf_k)[:top_k]
+
+        dense_ids = {m.id for m in dense}
+        self.last_stats = {
+            "dense_candidates": len(dense),
+            "lexical_candidates": len(lexical),
+            "overlap": len(dense_ids & {m.id for m in lexical}),
+            "returned": len(fused),
+            "lexical_only": sum(1 for item_id, _ in fused if item_id not in dense_ids),
+        }
+        return [VectorMatch(id=item_id, score=score, metadata=by_id[item_id].metadata) for item_id, score in fused]
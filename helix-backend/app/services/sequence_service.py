@@ -1,22 +1,61 @@
 # app/services/sequence_service.py
-import json
-import google.generativeai as genai
+import re
 from flask import current_app
-from ..extensions import db
-from ..models import Session, Sequence
+from sqlalchemy.exc import IntegrityError
+from ..extensions import db, clients, models
+from ..models import Session, Message, Sequence, SequenceVersion
+from .model_registry import SEQUENCE_GENERATION_CONFIG
+from .result_cache import make_cache_key
+from .json_stream import SequenceStreamParser
+from .unit_of_work import unit_of_work
+
+_ORDINALS = {"first": 0, "1st": 0, "opening": 0, "second": 1, "2nd": 1, "third": 2, "3rd": 2,
+             "fourth": 3, "4th": 3, "last": 3, "final": 3}
+_ORDINAL = "|".join(_ORDINALS)
+_PART = r"(?:e-?mails?|messages?|parts?|steps?|sequences?|ones?|follow-?ups?)"
+# "the second email", "first and third parts", "email 2", "parts #1 and #4"
+_ORDINAL_REF = re.compile(rf"\b((?:{_ORDINAL})(?:\s*(?:,|and|&|or)\s*(?:the\s+)?(?:{_ORDINAL}))*)\s+{_PART}\b", re.I)
+_NUMBER_REF = re.compile(rf"\b{_PART}\s*#?\s*([1-4](?:\s*(?:,|and|&|or)\s*#?\s*[1-4])*)\b", re.I)
+_ALL_REF = re.compile(r"\b(?:all|every|each|both|entire|whole)\b", re.I)
+# Exclusions name the parts NOT to touch, which the patterns above cannot
+# tell apart. A keyword only counts when it governs a part reference ("keep
+# the first", "except email 2", "leave email 1 unchanged") or when the
+# instruction speaks of "the rest"/"the others"; "keep it short" or
+# "don't use emojis" is an ordinary instruction.
+_PART_MENTION = rf"(?:the\s+)?(?:(?:{_ORDINAL})(?:\s+{_PART})?|{_PART}\s*#?\s*[1-4])"
+_EXCLUSION_REF = re.compile(
+    rf"\b(?:keep(?:ing)?|leav(?:e|ing)|except(?:\s+for)?|excluding|besides|apart\s+from|other\s+than|not|"
+    rf"(?:do\s+not|don'?t)\s+(?:touch|change|modify|edit|rewrite|update))\s+{_PART_MENTION}\b"
+    rf"|\b{_PART_MENTION}\s+(?:\w+\s+){{0,2}}?(?:unchanged|untouched|as\s+is)\b"
+    rf"|\b(?:the\s+)?(?:rest|others|other\s+{_PART}|remaining(?:\s+{_PART})?)\b(?!\s+of\b)",
+    re.I,
+)
+
+
+def target_indices(instruction, count=4):
+    # 0-based indices of the parts an instruction refers to, or all of them
+    # when it names none, says "all"/"every", or is phrased as an exclusion.
+    # Errs towards regenerating more.
+    if _ALL_REF.search(instruction) or _EXCLUSION_REF.search(instruction):
+        return list(range(count))
+    indices = set()
+    for match in _ORDINAL_REF.finditer(instruction):
+        indices.update(_ORDINALS[w.lower()] for w in re.findall(_ORDINAL, match.group(1), re.I))
+    for match in _NUMBER_REF.finditer(instruction):
+        indices.update(int(d) - 1 for d in re.findall(r"[1-4]", match.group(1)))
+    indices = sorted(i for i in indices if i < count)
+    return indices or list(range(count))
 
 class SequenceService:
     def __init__(self):
         api_key = current_app.config.get('GOOGLE_API_KEY')
         if not api_key: raise ValueError("GOOGLE_API_KEY not configured")
-        genai.configure(api_key=api_key)
-        self.generation_config_params = { 
-             "temperature": 0.8, "top_p": 0.95, "top_k": 40, "max_output_tokens": 8192,
-        }
-        self.modification_config_params = { 
-             "temperature": 0.6, "top_p": 0.95, "top_k": 40, "max_output_tokens": 8192,
-        }
-        self.model = genai.GenerativeModel(model_name="gemini-2.5-flash-preview-04-17")
+        clients.configure_genai()
+        self.generation_model = models.sequence_generation
+        self.modification_model = models.sequence_modification
+        self.last_cache_status = None
+        self.last_version = None
+        self.last_changed_seq_ids = []
 
     def _build_sequence_prompt(self, context):
         prompt = f"""
@@ -77,123 +116,300 @@ class SequenceService:
         """
         return prompt.strip()
 
+    def _build_targeted_modification_prompt(self, instruction, previous_sequences, indices):
+        previous_sequences_text = "\n".join(f"{i+1}. {seq}" for i, seq in enumerate(previous_sequences))
+        targets_text = ", ".join(str(i + 1) for i in indices)
 
-    def _parse_and_save_sequences(self, session_id, response_text, replace_existing=False):
-        raw_text = response_text
-        if raw_text.strip().startswith("```json"):
-             raw_text = raw_text.strip()[7:]
-             if raw_text.strip().endswith("```"):
-                 raw_text = raw_text.strip()[:-3]
+        prompt = f"""
+        You are tasked with modifying part of a set of 4 previously generated outreach message parts based on a specific instruction.
 
-        try:
-            data = json.loads(raw_text.strip())
-            generated_sequences_content = data.get("sequences", [])
-        except json.JSONDecodeError as e:
-             print(f"JSON Decode Error in _parse_and_save: {e}")
-             print(f"Raw text was: {raw_text}")
-             raise ValueError("Failed to decode JSON response from AI.") from e
-
-
-        if not isinstance(generated_sequences_content, list) or len(generated_sequences_content) != 4:
-             raise ValueError(f"Expected 4 sequences in JSON list, found {len(generated_sequences_content)}")
-
-        if replace_existing:
-             try:
-                 num_deleted = Sequence.query.filter_by(session_id=session_id).delete()
-                 db.session.commit() 
-                 print(f"Deleted {num_deleted} existing sequences for session {session_id}.")
-             except Exception as e:
-                 db.session.rollback()
-                 print(f"Error deleting existing sequences: {e}")
-                 raise 
-
-        saved_sequence_objects = [] 
-        for content in generated_sequences_content:
-            if isinstance(content, str) and content.strip():
-                
-                sequence = Sequence(session_id=session_id, seq_role='generated', seq_content=content)
-                db.session.add(sequence)
-                saved_sequence_objects.append(sequence)
-            else:
-                print(f"Warning: Skipping invalid sequence item received: {content}")
-
-        if not saved_sequence_objects:
-             raise ValueError("No valid sequences were generated or parsed from AI response.")
+        Modification Instruction:
+        {instruction}
 
-        try:
-            db.session.commit()
-            print(f"Committed {len(saved_sequence_objects)} new sequences for session {session_id}.")
-        except Exception as e:
-            db.session.rollback() 
-            print(f"Error committing new sequences: {e}")
-            raise 
+        Previous Message Parts:
+        {previous_sequences_text}
+
+        Apply the modification instruction ONLY to message part(s) {targets_text}. The other parts are kept as they are and are shown for context only; keep the modified parts consistent with them.
+
+        Output MUST be a valid JSON object containing ONLY a single key "sequences", which is an array of exactly {len(indices)} **modified** string(s): message part(s) {targets_text}, in that order. DO NOT output the unchanged parts. DO NOT include any other text or explanations before or after the JSON object.
+
+        Example JSON Output Structure:
+        ```json
+        {{
+          "sequences": [ /* {len(indices)} modified sequence string(s) here */ ]
+        }}
+        ```
+
+        Generate the JSON output containing the {len(indices)} modified sequence(s) now:
+        """
+        return prompt.strip()
 
-        return [
-            {
-                "seq_id": s.seq_id, 
-                "session_id": s.session_id,
-                "content": s.seq_content,
-                "role": s.seq_role,
-                "created_at": s.seq_created_at.isoformat() if s.seq_created_at else None,
-                "updated_at": s.seq_updated_at.isoformat() if s.seq_updated_at else None
-            }
-            for s in saved_sequence_objects
-        ]
 
+    @staticmethod
+    def _chunk_text(chunk):
+        # The closing chunk of a stream may carry only a finish reason.
+        try:
+            return chunk.text
+        except ValueError:
+            return ""
+
+    def _stream_sequences(self, model, prompt, parser):
+        # Yields each sequence as soon as its closing quote has streamed in.
+        for chunk in model.generate_content(contents=[prompt], stream=True):
+            yield from parser.feed(self._chunk_text(chunk))
+        yield from parser.finish()
+
+    @staticmethod
+    def _to_dict(s):
+        return {
+            "seq_id": s.seq_id,
+            "session_id": s.session_id,
+            "content": s.seq_content,
+            "role": s.seq_role,
+            "created_at": s.seq_created_at.isoformat() if s.seq_created_at else None,
+            "updated_at": s.seq_updated_at.isoformat() if s.seq_updated_at else None
+        }
 
-    def generate_sequences(self, session_id, generation_context):
+    @staticmethod
+    def _collect_parts(contents, indices, on_part=None):
+        # Validates the streamed replacements for parts `indices` and hands
+        # each to on_part(content, index) as soon as it arrives.
+        parts = []
+        for content in contents:
+            if len(parts) >= len(indices):
+                raise ValueError(f"Expected {len(indices)} sequences in JSON list, found more than {len(indices)}")
+            if not (isinstance(content, str) and content.strip()):
+                raise ValueError(f"Invalid sequence item received for part {indices[len(parts)] + 1}: {content}")
+            parts.append(content)
+            if on_part:
+                on_part(content, indices[len(parts) - 1])
+        if len(parts) != len(indices):
+            raise ValueError(f"Expected {len(indices)} sequences in JSON list, found {len(parts)}")
+        return parts
+
+    @staticmethod
+    def _latest_version(session_id):
+        # Backed by the (session_id, version_no) unique index.
+        return SequenceVersion.query.filter_by(session_id=session_id)\
+                                    .order_by(SequenceVersion.version_no.desc()).first()
+
+    def _write_version(self, session_id, source, contents, indices, base_seq_ids=None, instruction=None,
+                       seq_role='generated', title=None):
+        # Appends one version in a single transaction: a new Sequence row for
+        # each part in `indices`, the remaining parts shared with
+        # base_seq_ids, and - when `title` is given - the 'tool' message that
+        # records the new parts in the chat. Nothing is deleted, so a failure
+        # leaves the previous version current.
+        seq_ids = list(base_seq_ids) if base_seq_ids else [None] * len(indices)
+        new_rows = [(i, Sequence(session_id=session_id, seq_role=seq_role, seq_content=content))
+                    for i, content in zip(indices, contents)]
+        try:
+            db.session.add_all([row for _, row in new_rows])
+            db.session.flush()
+            for i, row in new_rows:
+                seq_ids[i] = row.seq_id
+            version = self._insert_version(session_id, source, instruction, seq_ids, [row.seq_id for _, row in new_rows])
+            if title:
+                text = f"{title}:\n" + "\n".join(f"{i+1}. {content}" for i, content in zip(indices, contents))
+                unit_of_work().add(Message(session_id=session_id, msg_role='tool', msg_content=text))
+            unit_of_work().flush()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error committing sequence version for session {session_id}: {e}")
+            raise
+        self.last_version = version.version_no
+        self.last_changed_seq_ids = version.changed_seq_ids
+        print(f"Committed sequence version {version.version_no} ({source}) for session {session_id}.")
+        return version
+
+    def _insert_version(self, session_id, source, instruction, seq_ids, changed_seq_ids, attempts=5):
+        # version_no is latest + 1. A concurrent edit of the same session can
+        # claim that number first; the unique constraint then rejects ours, so
+        # only the savepoint is rolled back and the next number is tried.
+        for attempt in range(attempts):
+            latest = self._latest_version(session_id)
+            version = SequenceVersion(
+                session_id=session_id,
+                version_no=(latest.version_no + 1) if latest else 1,
+                source=source,
+                instruction=instruction,
+                seq_ids=seq_ids,
+                changed_seq_ids=changed_seq_ids,
+            )
+            try:
+                with db.session.begin_nested():
+                    db.session.add(version)
+                return version
+            except IntegrityError:
+                if attempt + 1 == attempts:
+                    raise
+                print(f"Sequence version {version.version_no} of session {session_id} was taken concurrently; retrying.")
+
+    def _version_sequences(self, version):
+        rows = {s.seq_id: s for s in Sequence.query.filter(Sequence.seq_id.in_(version.seq_ids))}
+        return [self._to_dict(rows[seq_id]) for seq_id in version.seq_ids if seq_id in rows]
+
+    def _sequence_cache_key(self, context):
+        # Normalised _build_sequence_prompt inputs (same defaults), plus the
+        # prompt template, model and generation config that shape the output.
+        def norm(value):
+            return " ".join(str(value).split()).casefold()
+
+        return make_cache_key({
+            "target_role": norm(context.get('target_role', 'N/A')),
+            "company_context": norm(context.get('company_context', 'N/A')),
+            "key_selling_points": [norm(p) for p in context.get('key_selling_points', [])],
+            "candidate_persona": norm(context.get('candidate_persona', 'N/A')),
+            "tone": norm(context.get('tone', 'professional')),
+            "template": self._build_sequence_prompt({}),
+            "model": self.generation_model.model_name,
+            "generation_config": SEQUENCE_GENERATION_CONFIG,
+        })
+
+    def generate_sequences(self, session_id, generation_context, use_cache=True, on_part=None):
+        # self.last_cache_status: 'HIT', 'MISS', 'BYPASS' (fresh result, still
+        # stored) or None when the cache is disabled. on_part(content, index)
+        # is called as each part arrives, before the model has finished.
         session = Session.query.get(session_id)
         if not session: raise ValueError(f"Session {session_id} not found")
 
+        self.last_cache_status = None
+        cache = clients.get_sequence_cache()
+        cache_key = self._sequence_cache_key(generation_context) if cache is not None else None
+        if cache is not None:
+            cached = cache.get(cache_key) if use_cache else None
+            if cached is not None:
+                self.last_cache_status = 'HIT'
+                print(f"Sequence cache hit for session {session_id}.")
+                parts = self._collect_parts(cached, list(range(4)), on_part=on_part)
+                return self._version_sequences(self._write_version(session_id, 'generated', parts, list(range(4)),
+                                                                   title="Generated Sequences"))
+            self.last_cache_status = 'MISS' if use_cache else 'BYPASS'
+
         prompt = self._build_sequence_prompt(generation_context)
+        parser = SequenceStreamParser()
+        generated_sequences_content = []
+
+        def stream():
+            for content in self._stream_sequences(self.generation_model, prompt, parser):
+                generated_sequences_content.append(content)
+                yield content
+
+        # Release the connection while the model generates.
+        db.session.commit()
         try:
-            response = self.model.generate_content(
-                 contents=[prompt],
-                 generation_config=self.generation_config_params
-            )
-            return self._parse_and_save_sequences(session_id, response.text, replace_existing=True)
+            parts = self._collect_parts(stream(), list(range(4)), on_part=on_part)
+            version = self._write_version(session_id, 'generated', parts, list(range(4)), title="Generated Sequences")
+            if cache is not None:
+                cache.set(cache_key, generated_sequences_content)
+            return self._version_sequences(version)
         except Exception as e:
             db.session.rollback()
             print(f"Error during sequence generation: {e}")
             print(f"Failed Prompt:\n{prompt}")
-            if 'response' in locals(): print(f"Failed Response:\n{response.text if hasattr(response, 'text') else 'N/A'}")
+            if parser.text: print(f"Failed Response:\n{parser.text}")
             raise 
 
 
-    def modify_sequences(self, session_id, modification_instruction):
+    def modify_sequences(self, session_id, modification_instruction, on_part=None, parts=None):
+        # Regenerates only the parts the instruction targets: `parts` (1-based)
+        # when given, else the ones it names ("shorten the second email").
+        # Returns all 4 sequences of the new version; self.last_changed_seq_ids
+        # lists the new rows, the untouched parts keep their seq_id.
         session = Session.query.get(session_id)
         if not session: raise ValueError(f"Session {session_id} not found")
 
-        latest_sequences = Sequence.query.filter_by(session_id=session_id)\
-                                         .order_by(Sequence.seq_created_at.desc())\
-                                         .limit(4).all()
+        latest = self._latest_version(session_id)
+        latest_sequences = self._version_sequences(latest) if latest else []
         if len(latest_sequences) != 4:
              raise ValueError(f"Could not find 4 previous sequences for session {session_id} to modify.")
-        previous_sequences_content = [seq.seq_content for seq in reversed(latest_sequences)]
-
-        prompt = self._build_modification_prompt(modification_instruction, previous_sequences_content)
+        base_seq_ids = list(latest.seq_ids)
+        previous_sequences_content = [seq["content"] for seq in latest_sequences]
+
+        if parts:
+            if any(type(p) is not int or not 1 <= p <= 4 for p in parts):
+                raise ValueError("'parts' must be a list of message part numbers between 1 and 4.")
+            indices = sorted({p - 1 for p in parts})
+        else:
+            indices = target_indices(modification_instruction)
+
+        if len(indices) == 4:
+            prompt = self._build_modification_prompt(modification_instruction, previous_sequences_content)
+        else:
+            prompt = self._build_targeted_modification_prompt(modification_instruction, previous_sequences_content, indices)
+        parser = SequenceStreamParser()
+        db.session.commit()
         try:
-            response = self.model.generate_content(
-                 contents=[prompt],
-                 generation_config=self.modification_config_params
-            )
-            return self._parse_and_save_sequences(session_id, response.text, replace_existing=True)
+            stream = self._stream_sequences(self.modification_model, prompt, parser)
+            modified_parts = self._collect_parts(stream, indices, on_part=on_part)
+            version = self._write_version(session_id, 'modified', modified_parts, indices, base_seq_ids=base_seq_ids,
+                                          instruction=modification_instruction, title="Modified Sequences")
+            return self._version_sequences(version)
         except Exception as e:
             db.session.rollback()
             print(f"Error during sequence modification: {e}")
             print(f"Failed Prompt:\n{prompt}")
-            if 'response' in locals(): print(f"Failed Response:\n{response.text if hasattr(response, 'text') else 'N/A'}")
+            if parser.text: print(f"Failed Response:\n{parser.text}")
             raise
 
 
     def get_sequences_for_session(self, session_id):
-        sequences = Sequence.query.filter_by(session_id=session_id).order_by(Sequence.seq_created_at).all()
-        return [{"seq_id": s.seq_id, "session_id": s.session_id, "content": s.seq_content, "role": s.seq_role, "created_at": s.seq_created_at.isoformat(), "updated_at": s.seq_updated_at.isoformat()} for s in sequences]
+        latest = self._latest_version(session_id)
+        return self._version_sequences(latest) if latest else []
 
     def update_sequence(self, sequence_id, new_content):
+        # A manual edit is a new version too: the edited part gets a new row
+        # (and seq_id) with role 'edited'.
         sequence = Sequence.query.get(sequence_id)
         if not sequence: raise ValueError(f"Sequence with ID {sequence_id} not found.")
-        sequence.seq_content = new_content
-        sequence.seq_role = 'edited'
-        db.session.commit()
-        return {"seq_id": sequence.seq_id, "session_id": sequence.session_id, "content": sequence.seq_content, "role": sequence.seq_role, "created_at": sequence.seq_created_at.isoformat(), "updated_at": sequence.seq_updated_at.isoformat()}
\ No newline at end of file
+        latest = self._latest_version(sequence.session_id)
+        if not latest or sequence_id not in latest.seq_ids:
+            raise ValueError(f"Sequence with ID {sequence_id} is not part of the latest version.")
+        version = self._write_version(sequence.session_id, 'edited', [new_content], [latest.seq_ids.index(sequence_id)],
+                                      base_seq_ids=latest.seq_ids, seq_role='edited')
+        return self._to_dict(Sequence.query.get(version.changed_seq_ids[0]))
+
+    def list_versions(self, session_id, before=None, limit=100):
+        # Newest first, one page at a time: versions below the `before`
+        # cursor (a version_no); next_cursor is None on the last page.
+        query = SequenceVersion.query.filter(SequenceVersion.session_id == session_id)
+        if before is not None:
+            query = query.filter(SequenceVersion.version_no < before)
+        versions = query.order_by(SequenceVersion.version_no.desc()).limit(limit + 1).all()
+        has_more = len(versions) > limit
+        versions = versions[:limit]
+        return {
+            "session_id": session_id,
+            "versions": [v.to_dict() for v in versions],
+            "next_cursor": versions[-1].version_no if has_more else None,
+        }
+
+    def get_version(self, session_id, version_no):
+        version = SequenceVersion.query.filter_by(session_id=session_id, version_no=version_no).first()
+        if not version: raise ValueError(f"Version {version_no} not found for session {session_id}.")
+        return {**version.to_dict(), "sequences": self._version_sequences(version)}
+
+    def diff_versions(self, session_id, from_version_no, to_version_no):
+        # Parts are compared by seq_id; only the changed ones are loaded.
+        versions = {v.version_no: v for v in SequenceVersion.query.filter(
+            SequenceVersion.session_id == session_id,
+            SequenceVersion.version_no.in_([from_version_no, to_version_no]))}
+        for version_no in (from_version_no, to_version_no):
+            if version_no not in versions:
+                raise ValueError(f"Version {version_no} not found for session {session_id}.")
+        old_ids, new_ids = versions[from_version_no].seq_ids, versions[to_version_no].seq_ids
+        changed = [i for i in range(max(len(old_ids), len(new_ids)))
+                   if i >= len(old_ids) or i >= len(new_ids) or old_ids[i] != new_ids[i]]
+        wanted = {old_ids[i] for i in changed if i < len(old_ids)} | {new_ids[i] for i in changed if i < len(new_ids)}
+        rows = {s.seq_id: s for s in Sequence.query.filter(Sequence.seq_id.in_(wanted))} if wanted else {}
+
+        def part(ids, i):
+            return self._to_dict(rows[ids[i]]) if i < len(ids) and ids[i] in rows else None
+
+        return {
+            "session_id": session_id,
+            "from_version": from_version_no,
+            "to_version": to_version_no,
+            "unchanged_parts": [i for i in range(min(len(old_ids), len(new_ids))) if i not in changed],
+            "changes": [{"index": i, "from": part(old_ids, i), "to": part(new_ids, i)} for i in changed],
+        }
@@ -0,0 +1,12 @@
+# app/services/tokens.py
+import math
+
+# Gemini tokenizers average roughly 4 characters per token on English prose.
+# A local estimate avoids a count_tokens round trip on every call.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
@@ -0,0 +1,89 @@
+# app/services/unit_of_work.py
+from datetime import datetime
+from flask import g
+from sqlalchemy import event
+from ..extensions import db
+from ..models import Session
+
+
+class UnitOfWork:
+    # Rows written during one request (one HTTP call or Socket.IO event).
+    # add() only queues a row; flush() writes everything queued, plus
+    # whatever else is pending on db.session, in a single transaction.
+    # Services call flush() at their durability points - the end of a turn,
+    # or before handing results to a client - instead of committing per row.
+
+    def __init__(self):
+        self._pending = []
+        self.commits = 0
+
+    def add(self, obj):
+        self._pending.append(obj)
+        return obj
+
+    def pending(self, model=None, **attrs):
+        # Queued rows, for reads that must see this request's writes before
+        # they are committed (e.g. the user message in the chat history).
+        return [obj for obj in self._pending
+                if (model is None or isinstance(obj, model))
+                and all(getattr(obj, k, None) == v for k, v in attrs.items())]
+
+    def flush(self):
+        db.session.add_all(self._pending)
+        self._pending = []
+        try:
+            # New messages, sequences and versions bump their session's
+            # updated_at, which is what history readers revalidate against.
+            # Rows flushed earlier in the transaction (e.g. inside a
+            # savepoint) were recorded by _record_touched_sessions.
+            db.session.flush()
+            touched = db.session.info.pop('touched_sessions', set())
+            if touched:
+                Session.query.filter(Session.s_id.in_(touched))\
+                             .update({Session.updated_at: datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self.commits += 1
+
+    def discard(self):
+        self._pending = []
+
+
+def unit_of_work():
+    if 'unit_of_work' not in g:
+        g.unit_of_work = UnitOfWork()
+    return g.unit_of_work
+
+
+def _record_touched_sessions(session, flush_context, instances):
+    touched = {obj.session_id for obj in session.new if getattr(obj, 'session_id', None)}
+    if touched:
+        session.info.setdefault('touched_sessions', set()).update(touched)
+
+
+def _forget_touched_sessions(session, transaction):
+    # Only the outermost transaction: a rolled-back savepoint leaves the
+    # rows flushed before it in place.
+    if transaction.parent is None:
+        session.info.pop('touched_sessions', None)
+
+
+def init_app(app):
+    if not event.contains(db.session, 'before_flush', _record_touched_sessions):
+        event.listen(db.session, 'before_flush', _record_touched_sessions)
+        event.listen(db.session, 'after_transaction_end', _forget_touched_sessions)
+
+    @app.teardown_appcontext
+    def flush_unit_of_work(exc):
+        # Safety net for rows nobody flushed; registered after db.init_app,
+        # so it runs before Flask-SQLAlchemy removes the session.
+        uow = g.pop('unit_of_work', None)
+        if uow is None or not uow.pending():
+            return
+        print(f"Warning: Flushing {len(uow.pending())} unflushed rows at the end of the request.")
+        try:
+            uow.flush()
+        except Exception as e:
+            print(f"Error flushing unit of work at teardown: {e}")
@@ -0,0 +1,130 @@
+# app/services/vector_store.py
+from dataclasses import dataclass, field
+
+
+@dataclass
+class VectorMatch:
+    id: str
+    score: float
+    metadata: dict = field(default_factory=dict)
+    values: list = None
+
+
+class VectorStore:
+    # Common surface used by DocumentService / ChatService. `vectors` are
+    # (id, values, metadata) tuples; `filter` uses Pinecone's metadata filter
+    # syntax ({"filename": "a.pdf"}, {"chunk_index": {"$gte": 3}}, $and/$or, ...).
+
+    name = "base"
+
+    def upsert(self, vectors) -> int:
+        raise NotImplementedError
+
+    def query(self, vector, top_k=10, filter=None, include_values=False) -> list:
+        raise NotImplementedError
+
+    def delete(self, ids) -> None:
+        raise NotImplementedError
+
+    def describe(self) -> dict:
+        raise NotImplementedError
+
+
+class PineconeVectorStore(VectorStore):
+    name = "pinecone"
+    upsert_batch_size = 100
+    delete_batch_size = 1000
+
+    def __init__(self, index_provider):
+        # index_provider is ClientRegistry.get_index so the periodic dimension
+        # re-check still happens on the shared handle.
+        self._index_provider = index_provider
+
+    @property
+    def index(self):
+        return self._index_provider()
+
+    def upsert(self, vectors) -> int:
+        vectors = list(vectors)
+        upserted_count = 0
+        for i in range(0, len(vectors), self.upsert_batch_size):
+            batch = vectors[i:i + self.upsert_batch_size]
+            upsert_response = self.index.upsert(vectors=batch)
+            if getattr(upsert_response, 'upserted_count', None) is not None:
+                upserted_count += upsert_response.upserted_count
+            else:
+                upserted_count += len(batch)
+        return upserted_count
+
+    def query(self, vector, top_k=10, filter=None, include_values=False) -> list:
+        kwargs = {"vector": vector, "top_k": top_k, "include_metadata": True, "include_values": include_values}
+        if filter:
+            kwargs["filter"] = filter
+        query_response = self.index.query(**kwargs)
+        matches = getattr(query_response, 'matches', None) or []
+        return [
+            VectorMatch(
+                id=match.id,
+                score=match.score,
+                metadata=dict(match.metadata or {}),
+                values=list(match.values) if include_values and getattr(match, 'values', None) else None,
+            )
+            for match in matches
+        ]
+
+    def delete(self, ids) -> None:
+        ids = list(ids)
+        for i in range(0, len(ids), self.delete_batch_size):
+            self.index.delete(ids=ids[i:i + self.delete_batch_size])
+
+    def describe(self) -> dict:
+        stats = self.index.describe_index_stats()
+        return {
+            "backend": self.name,
+            "dimension": getattr(stats, 'dimension', None),
+            "vector_count": getattr(stats, 'total_vector_count', None),
+        }
+
+
+def matches_filter(metadata, filter):
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if not _apply_operator(op, value, operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _apply_operator(op, value, operand):
+    if op == "$eq":
+        return value == operand
+    if op == "$ne":
+        return value != operand
+    if op == "$in":
+        return value in operand
+    if op == "$nin":
+        return value not in operand
+    if op == "$exists":
+        return (value is not None) == bool(operand)
+    if value is None:
+        return False
+    if op == "$gt":
+        return value > operand
+    if op == "$gte":
+        return value >= operand
+    if op == "$lt":
+        return value < operand
+    if op == "$lte":
+        return value <= operand
+    raise ValueError(f"Unsupported metadata filter operator: {op}")
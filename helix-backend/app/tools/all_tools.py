@@ -51,6 +51,11 @@ modify_sequences_declaration = {
             "modification_instruction": {
                 "type": "string",
                 "description": "The user's specific request for how to change the existing sequences (e.g., 'use the name Tarun instead of [Candidate Name]', 'make the tone professional')."
+            },
+            "target_parts": {
+                "type": "array",
+                "items": {"type": "integer"},
+                "description": "Optional. The message parts (1-4) the instruction applies to, e.g. [2] for 'shorten the second email'. Omit when the change applies to all 4 parts."
             }
             
         },
@@ -58,13 +63,34 @@ modify_sequences_declaration = {
     }
 }
 
+# Tool for searching the uploaded documents; runs on the server inside the chat turn
+search_documents_declaration = {
+    "name": "search_documents",
+    "description": "Searches the recruiter's uploaded documents (job descriptions, candidate CVs, company material) and returns the most relevant passages. Call this ONLY when answering needs facts from those documents that are not already in the conversation. Do not call it for general recruitment advice, small talk, or sequence generation and modification.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "A self-contained search query with the names, roles, skills or identifiers to look for (e.g., 'senior Go engineer candidates with Kubernetes experience')."
+            }
+        },
+        "required": ["query"]
+    }
+}
+
 # list of all tools
 ALL_TOOLS = [
     types.Tool(function_declarations=[generate_outreach_sequences_declaration]),
-    types.Tool(function_declarations=[modify_sequences_declaration])
+    types.Tool(function_declarations=[modify_sequences_declaration]),
+    types.Tool(function_declarations=[search_documents_declaration])
 ]
 
+# Executed by ChatService during the turn; every other call is returned to the client
+SERVER_TOOLS = {"search_documents"}
+
 # Individual exports 
 GENERATE_SEQUENCES_TOOL = types.Tool(function_declarations=[generate_outreach_sequences_declaration])
 MODIFY_SEQUENCES_TOOL = types.Tool(function_declarations=[modify_sequences_declaration])
+SEARCH_DOCUMENTS_TOOL = types.Tool(function_declarations=[search_documents_declaration])
 
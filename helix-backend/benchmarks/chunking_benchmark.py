@@ -0,0 +1,125 @@
+# benchmarks/chunking_benchmark.py
+#
+# Compares the legacy fixed-window splitter with the structure-aware chunker
+# on a fixture corpus of job descriptions and résumés. Every query has an
+# expected answer span; a query counts as recalled at k when one of the top k
+# retrieved chunks contains the whole span. Retrieval is a local BM25 so the
+# numbers do not depend on the embedding API.
+#
+#   python benchmarks/chunking_benchmark.py [--corpus PATH] [--k 3 5 10]
+import os
+import re
+import sys
+import json
+import math
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.chunking import iter_structured_chunks  # noqa: E402
+from app.services.document_service import split_text_basic  # noqa: E402
+from app.services.tokens import estimate_tokens  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "chunking_corpus.json")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return _WORD.findall(text.lower())
+
+
+def normalize(text):
+    return " ".join(text.split())
+
+
+class BM25:
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = [Counter(tokenize(d)) for d in documents]
+        self.lengths = [sum(d.values()) for d in self.docs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        df = Counter(term for d in self.docs for term in d)
+        n = len(self.docs)
+        self.idf = {term: math.log(1 + (n - f + 0.5) / (f + 0.5)) for term, f in df.items()}
+
+    def top_k(self, query, k):
+        terms = tokenize(query)
+        scores = []
+        for i, doc in enumerate(self.docs):
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / self.avg_length)
+            score = sum(
+                self.idf.get(t, 0.0) * doc[t] * (self.k1 + 1) / (doc[t] + norm)
+                for t in terms if t in doc
+            )
+            scores.append((score, i))
+        scores.sort(key=lambda s: (-s[0], s[1]))
+        return [i for _, i in scores[:k]]
+
+
+def legacy_chunks(documents, chunk_size, chunk_overlap):
+    return [chunk for text in documents.values() for chunk in split_text_basic(text, chunk_size, chunk_overlap)]
+
+
+def structured_chunks(documents, target_tokens, overlap_tokens):
+    return [
+        chunk["text"]
+        for text in documents.values()
+        for chunk in iter_structured_chunks([(1, text)], target_tokens=target_tokens, overlap_tokens=overlap_tokens)
+    ]
+
+
+def evaluate(chunks, queries, ks):
+    index = BM25(chunks)
+    normalized = [normalize(c) for c in chunks]
+    results = {}
+    for k in ks:
+        hits, prompt_tokens = 0, 0
+        for q in queries:
+            top = index.top_k(q["query"], k)
+            answer = normalize(q["answer"])
+            hits += any(answer in normalized[i] for i in top)
+            prompt_tokens += sum(estimate_tokens(chunks[i]) for i in top)
+        recall = hits / len(queries)
+        mean_tokens = prompt_tokens / len(queries)
+        results[k] = {
+            "recall": recall,
+            "mean_prompt_tokens": mean_tokens,
+            "recall_per_1k_tokens": (recall * 1000 / mean_tokens) if mean_tokens else 0.0,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chunkers by recall per prompt token.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5, 10])
+    parser.add_argument("--legacy-chunk-size", type=int, default=1000)
+    parser.add_argument("--legacy-overlap", type=int, default=100)
+    parser.add_argument("--target-tokens", type=int, default=256)
+    parser.add_argument("--overlap-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = json.load(f)
+    documents, queries = corpus["documents"], corpus["queries"]
+
+    runs = {
+        f"split_text_basic({args.legacy_chunk_size}/{args.legacy_overlap} chars)":
+            legacy_chunks(documents, args.legacy_chunk_size, args.legacy_overlap),
+        f"iter_structured_chunks({args.target_tokens}/{args.overlap_tokens} tokens)":
+            structured_chunks(documents, args.target_tokens, args.overlap_tokens),
+    }
+
+    print(f"{len(documents)} documents, {len(queries)} queries")
+    for name, chunks in runs.items():
+        sizes = [estimate_tokens(c) for c in chunks]
+        print(f"\n{name}: {len(chunks)} chunks, mean {sum(sizes) / len(sizes):.0f} tokens/chunk")
+        for k, r in evaluate(chunks, queries, args.k).items():
+            print(f"  k={k:<3} recall={r['recall']:.3f}  prompt_tokens={r['mean_prompt_tokens']:.0f}"
+                  f"  recall/1k_tokens={r['recall_per_1k_tokens']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
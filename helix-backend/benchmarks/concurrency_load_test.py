@@ -0,0 +1,197 @@
+# benchmarks/concurrency_load_test.py
+#
+# Measures how many chat turns one backend process keeps in flight. A fake
+# Gemini endpoint (REST, fixed latency) runs in this process; the backend is
+# started in a child process per mode and N sessions post a message each at
+# the same time.
+#
+# Modes:
+#   blocking   eventlet server without monkey patching, which is what
+#              `python run.py` did before ASYNC_MODE existed: every SDK call
+#              stalls the whole event loop
+#   threading  ASYNC_MODE=threading, one OS thread per request
+#   eventlet   ASYNC_MODE=eventlet, run.py monkey-patches the process
+#
+#   python benchmarks/concurrency_load_test.py [--modes blocking eventlet] [--concurrency 100] [--latency 0.5]
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeGemini(BaseHTTPRequestHandler):
+    latency = 0.5
+    in_flight = 0
+    peak_in_flight = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.peak_in_flight = max(cls.peak_in_flight, cls.in_flight)
+        try:
+            time.sleep(cls.latency)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+        body = json.dumps({"candidates": [{
+            "content": {"parts": [{"text": "Happy to help with your search."}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0,
+        }]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(mode, port):
+    # Child process entry point. 'threading' and 'eventlet' start the real
+    # entry point, run.py; 'blocking' reproduces the old socketio.run(app)
+    # under eventlet without monkey patching.
+    sys.path.insert(0, BACKEND_ROOT)
+    os.environ['PORT'] = str(port)
+    if mode == 'blocking':
+        from app import create_app
+        from app.extensions import socketio
+        app = create_app()
+    else:
+        import run
+        app = run.app
+    from app.extensions import db
+    with app.app_context():
+        db.create_all()
+    if mode == 'blocking':
+        socketio.run(app, host='127.0.0.1', port=port, log_output=False)
+    else:
+        run.main()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def request(url, payload=None, timeout=300):
+    data = json.dumps(payload or {}).encode()
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def wait_for_port(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"backend did not start on port {port}")
+
+
+def run_mode(mode, concurrency, upstream_url, workdir):
+    port = free_port()
+    env = dict(
+        os.environ,
+        ASYNC_MODE='threading' if mode == 'threading' else 'eventlet',
+        GENAI_TRANSPORT='rest',
+        GENAI_API_ENDPOINT=upstream_url,
+        GOOGLE_API_KEY='load-test',
+        DATABASE_URI='sqlite:///' + os.path.join(workdir, f'{mode}.db'),
+        VECTOR_STORE_BACKEND='local',
+        LOCAL_VECTOR_STORE_PATH=os.path.join(workdir, f'{mode}-vectors'),
+        EMBEDDING_CACHE_PATH=os.path.join(workdir, f'{mode}-embeddings.sqlite3'),
+        INGESTION_RESUME_ON_STARTUP='0',
+        PYTHONWARNINGS='ignore',
+    )
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode, '--port', str(port)],
+                             env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        base = f"http://127.0.0.1:{port}/api/chat"
+        sessions = [request(f"{base}/")["session_id"] for _ in range(concurrency)]
+        FakeGemini.peak_in_flight = 0
+
+        def turn(session_id):
+            started = time.perf_counter()
+            try:
+                request(f"{base}/{session_id}/message", {"message": "Any tips for sourcing SREs?"})
+                return time.perf_counter() - started, None
+            except Exception as e:
+                return time.perf_counter() - started, e
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(turn, sessions))
+        wall = time.perf_counter() - started
+    finally:
+        child.terminate()
+        child.wait(timeout=10)
+
+    latencies = sorted(t for t, error in results if error is None)
+    errors = sum(1 for _, error in results if error is not None)
+
+    def percentile(p):
+        return latencies[min(int(p * len(latencies)), len(latencies) - 1)] if latencies else float('nan')
+
+    return {
+        "mode": mode,
+        "ok": len(latencies),
+        "errors": errors,
+        "wall_seconds": wall,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "p50": percentile(0.5),
+        "p95": percentile(0.95),
+        "peak_upstream_in_flight": FakeGemini.peak_in_flight,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent chat turns per backend process.")
+    parser.add_argument("--modes", nargs="+", default=["blocking", "eventlet"], choices=["blocking", "threading", "eventlet"])
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake Gemini latency in seconds")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    FakeGemini.latency = args.latency
+    upstream = ThreadingHTTPServer(('127.0.0.1', 0), FakeGemini)
+    upstream.daemon_threads = True
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}"
+
+    print(f"{args.concurrency} concurrent chat turns, fake Gemini latency {args.latency:.2f}s")
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in args.modes:
+            r = run_mode(mode, args.concurrency, upstream_url, workdir)
+            print(f"  {r['mode']:<10} ok={r['ok']:<4} errors={r['errors']:<3} wall={r['wall_seconds']:.1f}s"
+                  f"  throughput={r['throughput']:.1f} req/s  p50={r['p50']:.2f}s  p95={r['p95']:.2f}s"
+                  f"  peak_in_flight={r['peak_upstream_in_flight']}")
+    upstream.shutdown()
+
+
+if __name__ == "__main__":
+    main()
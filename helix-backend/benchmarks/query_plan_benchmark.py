@@ -0,0 +1,184 @@
+# benchmarks/query_plan_benchmark.py
+#
+# Seeds a database with sessions, messages and sequence versions, then runs
+# the per-session lookups the services issue on every turn, first without
+# and then with the composite indexes from migration e3a91c5d7f42. Prints
+# p50/p95 latency and the EXPLAIN plan of each query in both phases.
+#
+# SQLite (a temporary file) by default; pass --database-url to run against
+# Postgres. The benchmark drops and recreates the tables it uses, so point
+# it at a scratch database.
+#
+#   python benchmarks/query_plan_benchmark.py [--database-url URL] [--messages 2000000] [--sessions 20000]
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.extensions import db  # noqa: E402
+from app.models import Session, Message, Sequence, SequenceVersion, PromptVersion  # noqa: E402
+
+BATCH = 50_000
+TABLES = [PromptVersion.__table__, Session.__table__, Message.__table__, Sequence.__table__,
+          SequenceVersion.__table__]
+INDEXES = [index for table in (Message.__table__, Sequence.__table__) for index in table.indexes]
+
+
+def queries(session_id):
+    # The statements ChatService, HistoryBuilder and SequenceService build.
+    m, s, v = Message.__table__, Sequence.__table__, SequenceVersion.__table__
+    return {
+        "history (HistoryBuilder._unsummarised)":
+            sa.select(m.c.msg_id, m.c.msg_role, m.c.msg_content)
+              .where(m.c.session_id == session_id)
+              .order_by(m.c.msg_created_at, m.c.msg_id),
+        "rag recent user messages (enhance_with_rag)":
+            sa.select(m).where(m.c.session_id == session_id, m.c.msg_role == 'user')
+              .order_by(m.c.msg_created_at.desc()).limit(3),
+        "latest sequence version (_latest_version)":
+            sa.select(v).where(v.c.session_id == session_id).order_by(v.c.version_no.desc()).limit(1),
+        "session sequences (Session.sequences)":
+            sa.select(s).where(s.c.session_id == session_id).order_by(s.c.seq_created_at),
+    }
+
+
+def seed(engine, sessions, messages, versions_per_session):
+    # Sessions are interleaved in time, as they are in production: every
+    # session's messages are spread over the whole table.
+    rng = random.Random(7)
+    start = datetime(2026, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(Session.__table__.insert(), [
+            {"s_id": i, "created_at": start, "updated_at": start} for i in range(1, sessions + 1)
+        ])
+
+    rows = []
+    for i in range(messages):
+        rows.append({
+            "session_id": rng.randint(1, sessions),
+            "msg_role": 'user' if i % 2 == 0 else 'model',
+            "msg_content": f"message {i} " + "lorem ipsum " * rng.randint(2, 20),
+            "msg_created_at": start + timedelta(seconds=i),
+        })
+        if len(rows) == BATCH:
+            with engine.begin() as conn:
+                conn.execute(Message.__table__.insert(), rows)
+            rows = []
+    if rows:
+        with engine.begin() as conn:
+            conn.execute(Message.__table__.insert(), rows)
+
+    seq_id = 0
+    sequences, versions = [], []
+    for session_id in range(1, sessions + 1):
+        current = []
+        for version_no in range(1, versions_per_session + 1):
+            changed = range(4) if version_no == 1 else [rng.randrange(4)]
+            current = current or [None] * 4
+            for part in changed:
+                seq_id += 1
+                current[part] = seq_id
+                sequences.append({"seq_id": seq_id, "session_id": session_id, "seq_role": 'generated',
+                                  "seq_content": f"sequence {seq_id}", "seq_created_at": start + timedelta(seconds=seq_id),
+                                  "seq_updated_at": start})
+            versions.append({"session_id": session_id, "version_no": version_no, "source": 'generated',
+                             "seq_ids": list(current), "changed_seq_ids": [current[p] for p in changed],
+                             "created_at": start})
+        if len(sequences) >= BATCH:
+            with engine.begin() as conn:
+                conn.execute(Sequence.__table__.insert(), sequences)
+                conn.execute(SequenceVersion.__table__.insert(), versions)
+            sequences, versions = [], []
+    if sequences:
+        with engine.begin() as conn:
+            conn.execute(Sequence.__table__.insert(), sequences)
+            conn.execute(SequenceVersion.__table__.insert(), versions)
+
+
+def explain(conn, statement):
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == 'sqlite':
+        return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+    return [row[0] for row in conn.exec_driver_sql(f"EXPLAIN ANALYZE {sql}")]
+
+
+def measure(engine, sessions, runs):
+    rng = random.Random(11)
+    picks = [rng.randint(1, sessions) for _ in range(runs)]
+    results = {}
+    with engine.connect() as conn:
+        for name in queries(1):
+            timings = []
+            for session_id in picks:
+                started = time.perf_counter()
+                conn.execute(queries(session_id)[name]).fetchall()
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            results[name] = {
+                "p50_ms": timings[len(timings) // 2] * 1000,
+                "p95_ms": timings[min(int(len(timings) * 0.95), len(timings) - 1)] * 1000,
+                "plan": explain(conn, queries(picks[0])[name]),
+            }
+    return results
+
+
+def analyze(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-session query latency and plans before/after the history indexes.")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--messages", type=int, default=2_000_000)
+    parser.add_argument("--sessions", type=int, default=20_000)
+    parser.add_argument("--versions-per-session", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        url = args.database_url or 'sqlite:///' + os.path.join(workdir, 'query_plan.db')
+        engine = sa.create_engine(url)
+        db.metadata.drop_all(engine, tables=TABLES)
+        db.metadata.create_all(engine, tables=TABLES)
+        with engine.begin() as conn:
+            for index in INDEXES:
+                index.drop(conn)
+
+        started = time.perf_counter()
+        seed(engine, args.sessions, args.messages, args.versions_per_session)
+        print(f"{engine.dialect.name}: seeded {args.messages} messages across {args.sessions} sessions "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        analyze(engine)
+        before = measure(engine, args.sessions, args.runs)
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            for index in INDEXES:
+                index.create(conn)
+        analyze(engine)
+        print(f"created {len(INDEXES)} indexes in {time.perf_counter() - started:.1f}s")
+        after = measure(engine, args.sessions, args.runs)
+
+        for name in before:
+            b, a = before[name], after[name]
+            print(f"\n{name}")
+            print(f"  before  p50={b['p50_ms']:8.2f}ms  p95={b['p95_ms']:8.2f}ms")
+            for line in b["plan"]:
+                print(f"          {line}")
+            print(f"  after   p50={a['p50_ms']:8.2f}ms  p95={a['p95_ms']:8.2f}ms"
+                  f"  ({b['p50_ms'] / a['p50_ms'] if a['p50_ms'] else float('inf'):.0f}x at p50)")
+            for line in a["plan"]:
+                print(f"          {line}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
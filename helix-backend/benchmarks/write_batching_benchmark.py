@@ -0,0 +1,124 @@
+# benchmarks/write_batching_benchmark.py
+#
+# Counts write commits per chat turn with the per-request unit of work
+# against the previous commit-per-row behaviour. Each turn posts a chat
+# message; every --sequence-every turns the session also generates a set of
+# sequences. The model is replaced by an instant in-process fake, so the
+# wall time is database and framework overhead only.
+#
+# 'per-row' replays the old behaviour by flushing the unit of work on every
+# add(), which is what ChatService._save_message used to do. It still
+# writes the sequence version and its tool message together, so it counts
+# one commit fewer per generation than the old endpoint did.
+#
+#   python benchmarks/write_batching_benchmark.py [--turns 500] [--database-url URL]
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import sqlalchemy as sa
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.candidates = []
+
+
+def fake_generate_content(self, contents=None, stream=False, **kwargs):
+    if stream:
+        payload = json.dumps({"sequences": [f"Outreach part {i + 1}. " + "Hello there. " * 40 for i in range(4)]})
+        return [FakeResponse(payload[i:i + 200]) for i in range(0, len(payload), 200)]
+    return FakeResponse("Happy to help. What is the target role, and what makes the team stand out?")
+
+
+def run(mode, args, workdir):
+    from app import create_app
+    from app.extensions import db
+    from app.services.unit_of_work import UnitOfWork
+
+    from app.config import Config
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database_url or 'sqlite:///' + os.path.join(workdir, f'{mode}.db')
+
+    app = create_app(BenchmarkConfig)
+    original_add = UnitOfWork.add
+    if mode == 'per-row':
+        def add_and_commit(self, obj):
+            original_add(self, obj)
+            self.flush()
+            return obj
+        UnitOfWork.add = add_and_commit
+
+    # Commits that wrote something; ending a read-only transaction is free.
+    commits = {"count": 0}
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip()[:6].upper() in ("INSERT", "UPDATE", "DELETE"):
+            conn.info["wrote"] = True
+
+    def on_commit(conn):
+        if conn.info.pop("wrote", False):
+            commits["count"] += 1
+    try:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            sa.event.listen(db.engine, 'before_cursor_execute', on_execute)
+            sa.event.listen(db.engine, 'commit', on_commit)
+        client = app.test_client()
+        session_id = client.post('/api/chat/').get_json()['session_id']
+        context = {"target_role": "SRE", "company_context": "Helix", "key_selling_points": ["remote", "equity", "oncall"],
+                   "candidate_persona": "k8s operator", "tone": "friendly"}
+
+        commits["count"] = 0
+        started = time.perf_counter()
+        for turn in range(args.turns):
+            response = client.post(f'/api/chat/{session_id}/message', json={"message": f"Turn {turn}: tell me more"})
+            assert response.status_code == 200, response.get_json()
+            if args.sequence_every and turn % args.sequence_every == args.sequence_every - 1:
+                response = client.post(f'/api/sequence/{session_id}/generate', json={"context": context})
+                assert response.status_code == 201, response.get_json()
+        wall = time.perf_counter() - started
+    finally:
+        UnitOfWork.add = original_add
+    return {"mode": mode, "commits": commits["count"], "wall": wall}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Commits per chat turn: unit of work vs commit per row.")
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--sequence-every", type=int, default=5, help="generate sequences every N turns (0 = never)")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file per mode")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_ROOT)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.update(
+            GOOGLE_API_KEY='benchmark',
+            VECTOR_STORE_BACKEND='local',
+            LOCAL_VECTOR_STORE_PATH=os.path.join(workdir, 'vectors'),
+            EMBEDDING_CACHE_PATH=os.path.join(workdir, 'embeddings.sqlite3'),
+            INGESTION_RESUME_ON_STARTUP='0',
+            HISTORY_TOKEN_BUDGET='1000000',
+        )
+        import google.generativeai as genai
+        genai.GenerativeModel.generate_content = fake_generate_content
+
+        print(f"{args.turns} chat turns, sequences generated every {args.sequence_every} turns")
+        results = [run(mode, args, workdir) for mode in ("per-row", "unit-of-work")]
+        for r in results:
+            print(f"  {r['mode']:<13} commits={r['commits']:<6} commits/turn={r['commits'] / args.turns:.2f}"
+                  f"  wall={r['wall']:.2f}s  ms/turn={r['wall'] * 1000 / args.turns:.2f}")
+        before, after = results
+        print(f"  commits reduced by {1 - after['commits'] / before['commits']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Add prompt version registry and move system prompts out of message
+
+Revision ID: 5a0f3e8c17d2
+Revises: c41d7a9e2b63
+Create Date: 2026-10-18 06:58:03.114207
+
+"""
+import hashlib
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a0f3e8c17d2'
+down_revision = 'c41d7a9e2b63'
+branch_labels = None
+depends_on = None
+
+SYSTEM_PROMPT_MARKER = '# SYSTEM PROMPT'
+
+
+def upgrade():
+    op.create_table('prompt_version',
+    sa.Column('prompt_version_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('prompt_version_id'),
+    sa.UniqueConstraint('content_hash')
+    )
+    with op.batch_alter_table('session', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('prompt_version_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_session_prompt_version_id', 'prompt_version', ['prompt_version_id'], ['prompt_version_id'])
+
+    # Every session used to start with a 'model' message holding the full
+    # system prompt. Store each distinct prompt once, point the session at it
+    # and drop the per-session copies.
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT m.msg_id, m.session_id, m.msg_content FROM message m "
+        "WHERE m.msg_role = 'model' AND NOT EXISTS ("
+        "  SELECT 1 FROM message e WHERE e.session_id = m.session_id AND ("
+        "    e.msg_created_at < m.msg_created_at OR (e.msg_created_at = m.msg_created_at AND e.msg_id < m.msg_id)))"
+    )).fetchall()
+
+    version_ids = {}
+    for msg_id, session_id, content in rows:
+        if SYSTEM_PROMPT_MARKER not in content:
+            continue
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        if digest not in version_ids:
+            bind.execute(
+                sa.text("INSERT INTO prompt_version (name, content_hash, content, created_at) "
+                        "VALUES (:name, :hash, :content, :now)"),
+                {"name": 'helix_system', "hash": digest, "content": content, "now": datetime.utcnow()},
+            )
+            version_ids[digest] = bind.execute(
+                sa.text("SELECT prompt_version_id FROM prompt_version WHERE content_hash = :hash"), {"hash": digest}
+            ).scalar()
+        bind.execute(sa.text("UPDATE session SET prompt_version_id = :version WHERE s_id = :sid"),
+                     {"version": version_ids[digest], "sid": session_id})
+        bind.execute(sa.text("DELETE FROM message WHERE msg_id = :msg_id"), {"msg_id": msg_id})
+
+
+def downgrade():
+    # Restore the per-session system prompt message, timestamped at session
+    # creation so it sorts first again.
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT s.s_id, s.created_at, p.content FROM session s "
+        "JOIN prompt_version p ON p.prompt_version_id = s.prompt_version_id"
+    )).fetchall()
+    for session_id, created_at, content in rows:
+        bind.execute(
+            sa.text("INSERT INTO message (session_id, msg_role, msg_content, msg_created_at) "
+                    "VALUES (:sid, 'model', :content, :created_at)"),
+            {"sid": session_id, "content": content, "created_at": created_at},
+        )
+
+    with op.batch_alter_table('session', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_session_prompt_version_id', type_='foreignkey')
+        batch_op.drop_column('prompt_version_id')
+
+    op.drop_table('prompt_version')
@@ -0,0 +1,70 @@
+"""Add sequence_version table for append-only sequence history
+
+Revision ID: b7d2e4f19a30
+Revises: 5a0f3e8c17d2
+Create Date: 2026-10-18 09:12:44.508311
+
+"""
+import json
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4f19a30'
+down_revision = '5a0f3e8c17d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sequence_version',
+    sa.Column('version_id', sa.Integer(), nullable=False),
+    sa.Column('session_id', sa.Integer(), nullable=False),
+    sa.Column('version_no', sa.Integer(), nullable=False),
+    sa.Column('source', sa.String(length=20), nullable=False),
+    sa.Column('instruction', sa.Text(), nullable=True),
+    sa.Column('seq_ids', sa.JSON(), nullable=False),
+    sa.Column('changed_seq_ids', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['session_id'], ['session.s_id'], ),
+    sa.PrimaryKeyConstraint('version_id'),
+    sa.UniqueConstraint('session_id', 'version_no', name='uq_sequence_version_session_id_version_no')
+    )
+
+    # Sessions only ever held their current set (older sets were deleted),
+    # so each one with sequences becomes version 1.
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT session_id, seq_id, seq_created_at FROM sequence ORDER BY session_id, seq_created_at, seq_id"
+    )).fetchall()
+    by_session = {}
+    for session_id, seq_id, created_at in rows:
+        by_session.setdefault(session_id, []).append((seq_id, created_at))
+    insert = sa.text(
+        "INSERT INTO sequence_version (session_id, version_no, source, seq_ids, changed_seq_ids, created_at) "
+        "VALUES (:sid, 1, 'generated', :seq_ids, :seq_ids, :created_at)"
+    ).bindparams(sa.bindparam('seq_ids', type_=sa.JSON()))
+    for session_id, sequences in by_session.items():
+        bind.execute(insert, {"sid": session_id, "seq_ids": [seq_id for seq_id, _ in sequences[-4:]],
+                              "created_at": sequences[-1][1] or datetime.utcnow()})
+
+
+def downgrade():
+    # Without versions the current set is "the newest rows of the session",
+    # so keep only the rows of each session's latest version.
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT v.session_id, v.seq_ids FROM sequence_version v WHERE NOT EXISTS ("
+        "  SELECT 1 FROM sequence_version n WHERE n.session_id = v.session_id AND n.version_no > v.version_no)"
+    )).fetchall()
+    for session_id, seq_ids in rows:
+        if isinstance(seq_ids, str):
+            seq_ids = json.loads(seq_ids)
+        params = {f"id{i}": seq_id for i, seq_id in enumerate(seq_ids)}
+        keep = ", ".join(f":{name}" for name in params) or "NULL"
+        bind.execute(sa.text(f"DELETE FROM sequence WHERE session_id = :sid AND seq_id NOT IN ({keep})"),
+                     {"sid": session_id, **params})
+
+    op.drop_table('sequence_version')
@@ -1,7 +1,33 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Must happen before anything imports socket, ssl or threading.
+if os.environ.get('ASYNC_MODE', 'eventlet') == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+
 from app import create_app
 from app.extensions import socketio
+from app.concurrency import is_green
 
 app = create_app()
 
+
+def main():
+    host = os.environ.get('HOST', '127.0.0.1')
+    port = int(os.environ.get('PORT', 5000))
+    if is_green():
+        # socketio.run listens with eventlet's default backlog of 50, which
+        # resets connections when a few hundred clients connect at once.
+        import eventlet.wsgi
+        listener = eventlet.listen((host, port), backlog=int(os.environ.get('LISTEN_BACKLOG', 1024)))
+        eventlet.wsgi.server(listener, app)
+    else:
+        # ASYNC_MODE=threading serves from Werkzeug, one thread per request.
+        socketio.run(app, host=host, port=port, allow_unsafe_werkzeug=True)
+
+
 if __name__ == '__main__':
-    socketio.run(app)
\ No newline at end of file
+    main()
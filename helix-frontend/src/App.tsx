@@ -81,7 +81,8 @@ function App() {
                    `${API_BASE_URL}/sequence/${sessionId}/modify`,
                    {
                        
-                       instruction: functionCall.args.modification_instruction
+                       instruction: functionCall.args.modification_instruction,
+                       parts: functionCall.args.target_parts
                    }
                );
                setSequences(response.data); 
@@ -114,10 +115,12 @@ function App() {
        seq.seq_id === sequenceId ? { ...seq, content: newContent, role: 'edited' } : seq
      ));
      try {
-       await axios.put(
+       // Edits are saved as a new version, so the part comes back with a new seq_id.
+       const response = await axios.put<Sequence>(
          `${API_BASE_URL}/sequence/${sequenceId}`,
          { content: newContent }
        );
+       setSequences(prev => prev.map(seq => seq.seq_id === sequenceId ? response.data : seq));
        console.log(`Sequence ${sequenceId} updated successfully.`);
      } catch (err) {
        console.error(`Error updating sequence ${sequenceId}:`, err);
@@ -84,25 +84,35 @@ function ChatBox({ sessionId, onFunctionCall }: ChatBoxProps) {
     setIsLoading(true);
     setError(null);
     try {
-      const response = await axios.get<{ 
-        messages: { 
-          msg_id: number, 
-          msg_content: string, 
-          msg_role: 'user' | 'model' | 'system' | 'tool' 
-        }[] 
-      }>(`${API_BASE_URL}/chat/${currentSessionId}/history`);
+      // The history is paginated by msg_id; follow next_cursor to the end.
+      const rawMessages: { 
+        msg_id: number, 
+        msg_content: string, 
+        msg_role: 'user' | 'model' | 'system' | 'tool' 
+      }[] = [];
+      let cursor: number | null = null;
+      do {
+        const response: { data: { messages: typeof rawMessages, next_cursor: number | null } } = await axios.get(
+          `${API_BASE_URL}/chat/${currentSessionId}/history`,
+          { params: cursor === null ? {} : { after: cursor } }
+        );
+        rawMessages.push(...response.data.messages);
+        cursor = response.data.next_cursor;
+      } while (cursor !== null);
       
-      const historyMessages: ChatMessage[] = response.data.messages.map(msg => ({
-        id: msg.msg_id,
-        text: msg.msg_content,
-        sender: msg.msg_role === 'user' ? 'user' : 
-               (msg.msg_role === 'model' || msg.msg_role === 'tool' ? 'ai' : 'system')
-      }));
+      // 'system' rows are server bookkeeping (retrieval references), not chat.
+      const historyMessages: ChatMessage[] = rawMessages
+        .filter(msg => msg.msg_role !== 'system')
+        .map(msg => ({
+          id: msg.msg_id,
+          text: msg.msg_content,
+          sender: msg.msg_role === 'user' ? 'user' : 'ai'
+        }));
       
       setMessages(historyMessages);
       
-      const hasRagMessage = historyMessages.some(msg => 
-        msg.sender === 'system' && msg.text.includes("Context enhancement activated")
+      const hasRagMessage = rawMessages.some(msg => 
+        msg.msg_role === 'system' && msg.msg_content.startsWith("[RAG REFERENCES]")
       );
       setRagActivated(hasRagMessage);
       